@@ -0,0 +1,38 @@
+from sqlalchemy import or_, select
+from backend.db import User, SuccessCriteriaDocument, SuccessCriteriaDocumentAccess as Access
+
+# Each permission includes the ones after it
+PERMISSIONS = ("edit", "view")
+
+
+def granting(permission):
+    """ACL permissions that allow `permission`."""
+    return PERMISSIONS[:PERMISSIONS.index(permission) + 1]
+
+
+def owner_id(email):
+    return select(User.id).where(User.email == email).scalar_subquery()
+
+
+def can_access(email, permission="view"):
+    """Condition on SuccessCriteriaDocument rows the user may access.
+
+    Added to the query that loads the document, so authorization costs no
+    extra round trip. `permission` is "view", "edit" or "owner".
+    """
+    owned = SuccessCriteriaDocument.owner_id == owner_id(email)
+    if permission == "owner":
+        return owned
+    shared = select(Access.id).where(
+        Access.document_id == SuccessCriteriaDocument.id,
+        Access.principal == email,
+        Access.permission.in_(granting(permission)),
+    ).exists()
+    return or_(owned, shared)
+
+
+def allows(scd, email, permission="view"):
+    """The same check on a cached get_scd() result, which carries its ACL."""
+    if scd["owner"]["email"] == email:
+        return True
+    return permission != "owner" and scd["acl"].get(email) in granting(permission)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import math
+import os
+import re
+import time
+import jwt
+
+# Admission control keeps the database pool (SQLAlchemy's default 5 + 10
+# connections) from being exhausted by one client or by heavy routes.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "10"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "30"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "12"))
+MAX_CONCURRENT_HEAVY = int(os.getenv("MAX_CONCURRENT_HEAVY", "2"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "100"))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "5"))
+HEAVY_QUEUE_TIMEOUT = float(os.getenv("HEAVY_QUEUE_TIMEOUT", "30"))
+
+# Imports, exports and audit log scans run in their own small pool
+HEAVY_ROUTES = re.compile(r"^/api/(requirements/(bulk-upload|export)|scd/\d+/export|audit-logs)")
+# Probes must never be throttled
+EXEMPT_ROUTES = {"/api/health", "/api/db-health"}
+# Sign-in and token refresh get their own buckets, so a client (or a shared
+# address) spending its budget on API calls can still log in again
+AUTH_ROUTES = {"/api/login", "/api/token/refresh", "/api/token/revoke"}
+
+
+def request_principal(scope, jwt_secret):
+    """The email in a valid bearer token, otherwise the client address.
+
+    The address is the one uvicorn took from X-Forwarded-For (--proxy-headers),
+    not the proxy's.
+    """
+    for name, value in scope.get("headers", []):
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            try:
+                payload = jwt.decode(value[7:].decode(), jwt_secret, algorithms=["HS256"], options={"verify_exp": False})
+                if payload.get("sub"):
+                    return f"user:{payload['sub']}"
+            except (jwt.PyJWTError, UnicodeDecodeError):
+                pass
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class TokenBuckets:
+    """One token bucket per principal, refilled at `rate` tokens per second."""
+
+    def __init__(self, rate, burst, idle_after=600):
+        self.rate = rate
+        self.burst = burst
+        self.idle_after = idle_after
+        self._buckets = {}
+        self._next_prune = time.monotonic() + idle_after
+
+    def take(self, principal):
+        """Take a token; returns 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self._prune(now)
+        tokens, updated = self._buckets.get(principal, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[principal] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[principal] = (tokens - 1, now)
+        return 0
+
+    def _prune(self, now):
+        # Buckets idle this long have refilled completely anyway
+        self._buckets = {p: b for p, b in self._buckets.items() if now - b[1] < self.idle_after}
+        self._next_prune = now + self.idle_after
+
+
+class ConcurrencyPool:
+    """Bounded concurrency with a bounded queue; waiters give up at their deadline."""
+
+    def __init__(self, name, limit, timeout, max_queued=MAX_QUEUED_REQUESTS):
+        self.name = name
+        self.limit = limit
+        self.timeout = timeout
+        self.max_queued = max_queued
+        self.active = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        if self.queued >= self.max_queued:
+            return False
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class AdmissionControl:
+    """ASGI middleware applying per-principal rate limits and per-route concurrency limits.
+
+    Requests over their principal's rate, or that cannot get a slot in their
+    route's pool before the queue deadline, are answered with 429 and a
+    Retry-After header. A slot is held until the response body has been
+    sent, so streamed exports count against their pool.
+    """
+
+    def __init__(self, app, jwt_secret, enabled=ADMISSION_CONTROL):
+        self.app = app
+        self.jwt_secret = jwt_secret
+        self.enabled = enabled
+        self.buckets = TokenBuckets(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+        self.pools = {
+            "default": ConcurrencyPool("default", MAX_CONCURRENT_REQUESTS, QUEUE_TIMEOUT),
+            "heavy": ConcurrencyPool("heavy", MAX_CONCURRENT_HEAVY, HEAVY_QUEUE_TIMEOUT),
+        }
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if not self.enabled or scope["type"] != "http" or not path.startswith("/api/") or path in EXEMPT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        principal = request_principal(scope, self.jwt_secret)
+        if path in AUTH_ROUTES:
+            principal = f"auth:{principal}"
+        wait = self.buckets.take(principal)
+        if wait:
+            await self.reject(send, wait, "Rate limit exceeded")
+            return
+
+        pool = self.pools["heavy" if HEAVY_ROUTES.match(path) else "default"]
+        if not await pool.acquire():
+            await self.reject(send, 1, f"Server busy ({pool.name} requests)")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
+
+    async def reject(self, send, retry_after, detail):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,73 @@
+import os
+from sqlalchemy import bindparam, or_, text
+from backend.db import AuditLog
+
+# Runs of at least this many consecutive ids are stored as [first, last]
+AUDIT_ID_RUN = int(os.getenv("AUDIT_ID_RUN", "4"))
+
+
+def compact_ids(ids):
+    """Sorted unique ids, with consecutive integer runs folded into id_ranges.
+
+    {"ids": [3, 9], "id_ranges": [[20, 5000]]} stands for 3, 9 and 20..5000,
+    so deleting a contiguous block of rows stores two numbers instead of
+    thousands. Non-integer ids (e.g. user emails) are kept as they are.
+    """
+    ids = sorted(set(ids))
+    if not ids or not all(isinstance(i, int) for i in ids):
+        return {"ids": ids}
+    singles, ranges = [], []
+    start = previous = ids[0]
+    for i in ids[1:] + [None]:
+        if i is not None and i == previous + 1:
+            previous = i
+            continue
+        if previous - start + 1 >= AUDIT_ID_RUN:
+            ranges.append([start, previous])
+        else:
+            singles.extend(range(start, previous + 1))
+        start = previous = i
+    result = {"ids": singles}
+    if ranges:
+        result["id_ranges"] = ranges
+    return result
+
+
+def audit_details(entity, ids=(), fields=None, **extra):
+    """Structured details for log_audit_action(details_json=...).
+
+    `entity` is the kind of object acted on ("requirement", "scd", "user",
+    "setting"), `ids` the objects and `fields` the names of changed fields;
+    anything else is stored as given.
+    """
+    details = {"entity": entity, **compact_ids(ids)}
+    if fields:
+        details["fields"] = sorted(fields)
+    details.update(extra)
+    return details
+
+
+def touching(entity, entity_id):
+    """Condition on audit_logs rows about one object, e.g. touching("requirement", 123).
+
+    Listed ids are found through the GIN index on details_json; id ranges
+    through the partial index on rows that have any.
+    """
+    column = AuditLog.details_json
+    listed = column.contains({"entity": entity, "ids": [entity_id]})
+    if not isinstance(entity_id, int):
+        return listed
+    in_range = text("""
+        (audit_logs.details_json ? 'id_ranges'
+         AND audit_logs.details_json->>'entity' = :range_entity
+         AND EXISTS (
+             SELECT 1 FROM jsonb_array_elements(audit_logs.details_json->'id_ranges') AS r
+             WHERE CAST(r->>0 AS bigint) <= :range_id AND CAST(r->>1 AS bigint) >= :range_id
+         ))
+    """).bindparams(bindparam("range_entity", entity), bindparam("range_id", entity_id))
+    return or_(listed, in_range)
+
+
+def changing(field):
+    """Condition on audit_logs rows whose event changed `field`."""
+    return AuditLog.details_json.contains({"fields": [field]})
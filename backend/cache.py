@@ -0,0 +1,411 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from backend.invalidation import bus
+from backend.db import replica_engine, REPLICA_MAX_LAG
+
+logger = logging.getLogger(__name__)
+
+# memory:// keeps entries in each process; redis://host:6379/0 shares them
+# between replicas and across restarts.
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+CACHE_TTL_JITTER = float(os.getenv("CACHE_TTL_JITTER", "0.1"))
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "1024"))
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "pov:")
+# How long other replicas wait for one replica's load before loading themselves
+LOAD_LOCK_TIMEOUT = float(os.getenv("CACHE_LOAD_LOCK_TIMEOUT", "10"))
+TAG_TTL = 86400
+
+MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe in-process cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl, maxsize=256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTLs and a tag index."""
+
+    shared = False
+
+    def __init__(self, maxsize=CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._tags = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value, tags = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def add(self, key, ttl, value=True):
+        # Loads only need coordinating between replicas; one process never waits on itself
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def delete_if(self, key, value):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] == value:
+                self._remove(key)
+
+    def versions(self, tags):
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def delete_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class RedisBackend:
+    """Shared cache on any Redis-protocol server.
+
+    Values are stored as JSON, so cached data must be JSON-serializable
+    (datetimes come back as ISO strings). Each tag is a set of the keys
+    stored under it plus a version counter bumped on invalidation. `client`
+    is any redis-py compatible client, e.g. fakeredis.FakeRedis() as a
+    local stand-in.
+    """
+
+    shared = True
+
+    def __init__(self, client, prefix=CACHE_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix=CACHE_PREFIX):
+        import redis
+        return cls(redis.Redis.from_url(url), prefix=prefix)
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def _tag(self, tag):
+        return f"{self.prefix}tag:{tag}"
+
+    def _version(self, tag):
+        return f"{self.prefix}tagver:{tag}"
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl, tags=()):
+        pipe = self.client.pipeline()
+        pipe.set(self._key(key), json.dumps(value, default=_json_default), ex=max(1, int(ttl)))
+        for tag in tags:
+            pipe.sadd(self._tag(tag), key)
+            pipe.expire(self._tag(tag), TAG_TTL)
+        pipe.execute()
+
+    def add(self, key, ttl, value=1):
+        return bool(self.client.set(self._key(key), value, nx=True, ex=max(1, int(ttl))))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def delete_if(self, key, value):
+        # WATCH rather than a Lua script, which not every Redis-protocol server runs
+        from redis.exceptions import WatchError
+        key = self._key(key)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.get(key)
+                if current is None or current.decode() != str(value):
+                    pipe.unwatch()
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+            except WatchError:
+                # Changed meanwhile, so no longer ours
+                pass
+
+    def versions(self, tags):
+        if not tags:
+            return ()
+        return tuple(self.client.mget([self._version(tag) for tag in tags]))
+
+    def delete_tags(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(self._version(tag))
+            pipe.expire(self._version(tag), TAG_TTL)
+            pipe.smembers(self._tag(tag))
+        members = pipe.execute()[2::3]
+        keys = [self._key(member.decode()) for group in members for member in group]
+        keys += [self._tag(tag) for tag in tags]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*", count=1000))
+        for i in range(0, len(keys), 1000):
+            self.client.delete(*keys[i:i + 1000])
+
+
+class Cache:
+    """Read-through cache for expensive reads.
+
+    get_or_load() runs the loader at most once per key at a time in this
+    process, and on a shared backend takes a short lock so other replicas
+    wait for the value instead of loading it too. TTLs get random jitter so
+    entries filled together do not all expire together. Writers call
+    invalidate() with the tags of the data they changed; the tags are
+    dropped here at once and on every replica when the transaction commits.
+    Values loaded from the read replica are not stored for REPLICA_MAX_LAG
+    seconds after an invalidation of their tags, since the replica may not
+    have replayed the write yet.
+    """
+
+    def __init__(self, backend, ttl=CACHE_TTL, jitter=CACHE_TTL_JITTER):
+        self.backend = backend
+        self.ttl = ttl
+        self.jitter = jitter
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        # Monotonic time of the last invalidation seen per tag, and of the last clear
+        self._invalidated_at = {}
+        self._cleared_at = float("-inf")
+        bus.subscribe("cache", self._on_invalidate, flush=self._on_gap)
+
+    def get_or_load(self, key, loader, ttl=None, tags=(), replica=False):
+        """Cached value of `key`, or loader()'s result, stored under `tags`.
+
+        Pass replica=True when the loader may read from the replica.
+        """
+        value = self._get(key)
+        if value is not MISSING:
+            return value
+        with self._key_lock(key):
+            value = self._get(key)
+            if value is not MISSING:
+                return value
+            # The lock holds a token of ours, so only its owner releases it: not a
+            # replica whose wait timed out, nor one whose load outlived the lock
+            lock_key = f"lock:{key}"
+            token = uuid.uuid4().hex
+            locked = self.backend.add(lock_key, LOAD_LOCK_TIMEOUT, token)
+            if not locked:
+                value = self._wait_for(key)
+                if value is not MISSING:
+                    return value
+            try:
+                versions = self._versions(tags)
+                value = loader()
+                # Skip storing if the data was invalidated while loading, or
+                # recently enough that the replica may have served old rows
+                if self._versions(tags) == versions and not (replica and self._replica_may_lag(tags)):
+                    self._set(key, value, self._jittered(ttl or self.ttl), tags)
+            finally:
+                if locked:
+                    self._delete_if(lock_key, token)
+            return value
+
+    def get(self, key, default=None):
+        value = self._get(key)
+        return default if value is MISSING else value
+
+    def set(self, key, value, ttl, tags=()):
+        self._set(key, value, ttl, tags)
+
+    def invalidate(self, db, *tags):
+        """Drop everything tagged with `tags`; the caller commits db."""
+        self._note_invalidated(tags)
+        self._delete_tags(tags)
+        bus.publish(db, "cache", list(tags))
+
+    def _note_invalidated(self, tags=None):
+        if replica_engine is None:
+            return
+        now = time.monotonic()
+        with self._locks_lock:
+            if tags is None:
+                self._cleared_at = now
+            for tag in tags or ():
+                self._invalidated_at[tag] = now
+            if len(self._invalidated_at) > CACHE_MAXSIZE:
+                self._invalidated_at = {
+                    tag: at for tag, at in self._invalidated_at.items() if now - at < REPLICA_MAX_LAG
+                }
+
+    def _replica_may_lag(self, tags):
+        since = time.monotonic() - REPLICA_MAX_LAG
+        with self._locks_lock:
+            return self._cleared_at > since or any(self._invalidated_at.get(tag, since) > since for tag in tags)
+
+    def _jittered(self, ttl):
+        return ttl * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _wait_for(self, key):
+        deadline = time.monotonic() + LOAD_LOCK_TIMEOUT
+        delay = 0.02
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            value = self._get(key)
+            if value is not MISSING:
+                return value
+            delay = min(delay * 2, 0.5)
+        return MISSING
+
+    @contextmanager
+    def _key_lock(self, key):
+        with self._locks_lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    # Backend errors degrade to cache misses rather than failing requests
+
+    def _get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception:
+            logger.exception("Cache get failed for %s", key)
+            return MISSING
+
+    def _set(self, key, value, ttl, tags):
+        try:
+            self.backend.set(key, value, ttl, tags)
+        except Exception:
+            logger.exception("Cache set failed for %s", key)
+
+    def _delete_if(self, key, value):
+        try:
+            self.backend.delete_if(key, value)
+        except Exception:
+            logger.exception("Cache delete failed for %s", key)
+
+    def _versions(self, tags):
+        try:
+            return self.backend.versions(tags)
+        except Exception:
+            logger.exception("Cache version lookup failed")
+            return None
+
+    def _delete_tags(self, tags):
+        try:
+            self.backend.delete_tags(tags)
+        except Exception:
+            logger.exception("Cache invalidation failed for %s", tags)
+
+    def _on_invalidate(self, tags):
+        self._note_invalidated(tags or None)
+        if tags:
+            self._delete_tags(tags)
+        else:
+            self.backend.clear()
+
+    def _on_gap(self):
+        self._note_invalidated()
+        # A shared backend saw every invalidation; a local one may have missed some
+        if not self.backend.shared:
+            self.backend.clear()
+
+
+def create_backend(url=CACHE_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend.from_url(url)
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    raise ValueError(f"Unsupported CACHE_URL {url!r}")
+
+
+cache = Cache(create_backend())
@@ -0,0 +1,99 @@
+import functools
+import json
+import threading
+from collections import defaultdict
+from fastapi import Request
+from sqlalchemy.orm import Session
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"requests": 0, "executions": 0})
+
+    def do(self, name, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            stats = self._stats[name]
+            stats["requests"] += 1
+            stats["executions"] += leader
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            items = [(name, dict(stats)) for name, stats in self._stats.items()]
+        result = {}
+        for name, stats in items:
+            coalesced = stats["requests"] - stats["executions"]
+            result[name] = {
+                **stats,
+                "coalesced": coalesced,
+                "coalescing_ratio": round(coalesced / stats["requests"], 4) if stats["requests"] else 0.0,
+            }
+        return result
+
+
+flights = SingleFlight()
+
+
+def coalesce(per_user=True):
+    """Share one in-flight run of a sync GET handler between identical requests.
+
+    Requests are identical when they hit the same handler with the same
+    parameters and authorization scope: the user's email, or only their role
+    when per_user is False and the result does not depend on who asks. The
+    db session and request are not part of the key, only whether the session
+    reads from the replica: a principal pinned to the primary after a write
+    must not receive a result read from the replica. Followers never use the
+    handler's session, and get_current_user ends its lookup's transaction, so
+    a waiting follower holds no pooled connection unless another dependency
+    has queried through its session.
+    """
+    def decorator(fn):
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(**kwargs):
+            params = {}
+            for param, value in kwargs.items():
+                if isinstance(value, Session):
+                    params[param] = "replica" if value.info.get("read_only") else "primary"
+                    continue
+                if isinstance(value, Request) or param == "request":
+                    continue
+                if param == "user":
+                    value = value.email if per_user else value.role
+                params[param] = value
+            key = (name, json.dumps(params, sort_keys=True, default=str))
+            return flights.do(name, key, lambda: fn(**kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,164 @@
+import os
+from sqlalchemy import text
+
+IMPORT_MODES = ("skip", "update", "insert")
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.6"))
+
+
+def _normalize(column):
+    return f"lower(regexp_replace(btrim(coalesce({column}, '')), '\\s+', ' ', 'g'))"
+
+
+# Case and whitespace insensitive fingerprint of a requirement. Stored as a
+# generated column with a unique index over rows not flagged allow_duplicate,
+# so exact duplicates are only ever inserted on purpose and imports can use
+# ON CONFLICT (content_hash) WHERE NOT allow_duplicate.
+CONTENT_HASH_SQL = (
+    f"md5({_normalize('category')} || chr(31) || {_normalize('requirement')} || chr(31) || "
+    f"regexp_replace({_normalize('product')}, ' ?[,;] ?', ',', 'g'))"
+)
+
+
+def _stage_rows(db, rows):
+    """Copy parsed CSV rows into a transaction-scoped temp table for set-based matching."""
+    db.execute(text(f"""
+        CREATE TEMP TABLE import_rows (
+            row_num integer PRIMARY KEY,
+            category text NOT NULL,
+            requirement text NOT NULL,
+            product text,
+            doc_link text,
+            tenant_link text,
+            content_hash text GENERATED ALWAYS AS ({CONTENT_HASH_SQL}) STORED
+        ) ON COMMIT DROP
+    """))
+    if rows:
+        db.execute(
+            text("""
+                INSERT INTO import_rows (row_num, category, requirement, product, doc_link, tenant_link)
+                VALUES (:row_num, :category, :requirement, :product, :doc_link, :tenant_link)
+            """),
+            rows,
+        )
+
+
+def _classify(db, threshold):
+    db.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"), {"threshold": str(threshold)})
+    return db.execute(text("""
+        SELECT i.row_num,
+               i.category,
+               i.requirement,
+               e.id AS existing_id,
+               row_number() OVER (PARTITION BY i.content_hash ORDER BY i.row_num) > 1 AS repeated_in_file,
+               n.id AS similar_id,
+               n.requirement AS similar_requirement,
+               n.similarity
+        FROM import_rows i
+        LEFT JOIN requirements e ON e.content_hash = i.content_hash AND NOT e.allow_duplicate
+        LEFT JOIN LATERAL (
+            SELECT r.id, r.requirement, similarity(r.requirement, i.requirement) AS similarity
+            FROM requirements r
+            WHERE e.id IS NULL AND r.requirement % i.requirement
+            ORDER BY r.requirement <-> i.requirement
+            LIMIT 1
+        ) n ON true
+        ORDER BY i.row_num
+    """)).mappings().all()
+
+
+def import_requirements(db, rows, user_email, mode="skip", dry_run=False, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Import CSV rows, resolving duplicates against the existing catalogue.
+
+    Rows whose content hash already exists are left alone in "skip" mode, have
+    their product and links refreshed in "update" mode and are inserted anyway
+    in "insert" mode, as are repeats within the file; those copies are flagged
+    allow_duplicate. Near-duplicates (trigram similarity above `threshold`)
+    are skipped in "skip" mode and inserted in the other modes.
+    With `dry_run` nothing is written and the classification is returned;
+    otherwise the caller commits db.
+    """
+    _stage_rows(db, rows)
+    classified = _classify(db, threshold)
+
+    preview = []
+    to_write = []
+    copies = []
+    for row in classified:
+        if row["existing_id"] is not None:
+            status = "duplicate"
+        elif row["repeated_in_file"]:
+            status = "duplicate_in_file"
+        elif row["similar_id"] is not None:
+            status = "near_duplicate"
+        else:
+            status = "new"
+        preview.append({
+            "row": row["row_num"],
+            "category": row["category"],
+            "requirement": row["requirement"],
+            "status": status,
+            "existing_id": row["existing_id"],
+            "similar_id": row["similar_id"],
+            "similar_requirement": row["similar_requirement"],
+            "similarity": row["similarity"],
+        })
+        if status == "new" or (status == "near_duplicate" and mode != "skip") or (status == "duplicate" and mode == "update"):
+            to_write.append(row["row_num"])
+        elif mode == "insert":
+            copies.append(row["row_num"])
+
+    summary = {
+        "mode": mode,
+        "dry_run": dry_run,
+        "new": sum(1 for p in preview if p["status"] == "new"),
+        "duplicates": sum(1 for p in preview if p["status"] in ("duplicate", "duplicate_in_file")),
+        "near_duplicates": sum(1 for p in preview if p["status"] == "near_duplicate"),
+    }
+    if dry_run:
+        db.rollback()
+        return {**summary, "count": 0, "updated": 0, "rows": preview}
+
+    on_conflict = "DO NOTHING"
+    if mode == "update":
+        on_conflict = """DO UPDATE SET product = EXCLUDED.product,
+                                     doc_link = EXCLUDED.doc_link,
+                                     tenant_link = EXCLUDED.tenant_link,
+                                     updated_at = EXCLUDED.updated_at,
+                                     updated_by = EXCLUDED.updated_by"""
+    written = db.execute(
+        text(f"""
+            INSERT INTO requirements (category, requirement, product, doc_link, tenant_link,
+                                      created_at, created_by, updated_at, updated_by)
+            SELECT DISTINCT ON (content_hash)
+                   category, requirement, product, doc_link, tenant_link,
+                   now() AT TIME ZONE 'utc', :user_email, now() AT TIME ZONE 'utc', :user_email
+            FROM import_rows
+            WHERE row_num = ANY(:row_nums)
+            ORDER BY content_hash, row_num
+            ON CONFLICT (content_hash) WHERE NOT allow_duplicate {on_conflict}
+            RETURNING (xmax = 0) AS inserted
+        """),
+        {"user_email": user_email, "row_nums": to_write},
+    ).scalars().all()
+    if copies:
+        written += db.execute(
+            text("""
+                INSERT INTO requirements (category, requirement, product, doc_link, tenant_link, allow_duplicate,
+                                          created_at, created_by, updated_at, updated_by)
+                SELECT category, requirement, product, doc_link, tenant_link, true,
+                       now() AT TIME ZONE 'utc', :user_email, now() AT TIME ZONE 'utc', :user_email
+                FROM import_rows
+                WHERE row_num = ANY(:row_nums)
+                ORDER BY row_num
+                RETURNING true AS inserted
+            """),
+            {"user_email": user_email, "row_nums": copies},
+        ).scalars().all()
+
+    inserted = sum(1 for flag in written if flag)
+    return {
+        **summary,
+        "count": inserted,
+        "updated": len(written) - inserted,
+        "rows": [p for p in preview if p["status"] == "near_duplicate"],
+    }
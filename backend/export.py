@@ -0,0 +1,296 @@
+import base64
+import csv
+import html
+import io
+import json
+import os
+import re
+import zlib
+from datetime import datetime
+from sqlalchemy import select, text
+from backend.db import SessionLocal, SuccessCriteriaDocumentRequirement, RequirementText
+from backend.cache import cache
+from backend.requirement_files import COLUMN_NAMES, xlsx_row
+from backend.stats import PRODUCTS_ARRAY_SQL
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "md": ("text/markdown", "md"),
+    "html": ("text/html", "html"),
+}
+# Same columns as bulk upload, so CSV and XLSX exports can be re-imported
+EXPORT_COLUMNS = COLUMN_NAMES
+EXPORT_BATCH_SIZE = 500
+# Rendered exports larger than this are streamed but not cached. Artifacts are
+# only cached in a shared backend (Redis): the in-process cache is bounded by
+# entry count, not bytes, and lives in each API pod's memory limit.
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(256 * 1024)))
+ARTIFACT_CACHE_TTL = int(os.getenv("ARTIFACT_CACHE_TTL", "86400"))
+
+
+def export_filename(name, fmt):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-").lower() or "document"
+    return f"{slug}.{EXPORT_FORMATS[fmt][1]}"
+
+
+def _rows(read_only, scd_id):
+    """SCD rows in `order` from a server-side cursor, EXPORT_BATCH_SIZE at a time."""
+    columns = [getattr(RequirementText, name) for name in EXPORT_COLUMNS]
+    with SessionLocal() as db:
+        db.info["read_only"] = read_only
+        result = db.execute(
+            select(*columns)
+            .join_from(SuccessCriteriaDocumentRequirement, RequirementText)
+            .where(SuccessCriteriaDocumentRequirement.document_id == scd_id)
+            .order_by(SuccessCriteriaDocumentRequirement.order, SuccessCriteriaDocumentRequirement.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        yield from result
+
+
+def render_csv(scd, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(["" if value is None else value for value in row])
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _links(row):
+    # Only web links; anything else (e.g. javascript:) is left out of rendered documents
+    return [
+        (label, url) for label, url in (("Docs", row.doc_link), ("Tenant", row.tenant_link))
+        if url and url.lower().startswith(("http://", "https://"))
+    ]
+
+
+def _md_cell(value):
+    value = (value or "").replace("\\", "\\\\").replace("|", "\\|").replace("<", "&lt;")
+    return value.replace("\r", "").replace("\n", "<br>")
+
+
+def render_md(scd, rows):
+    head = f"# {scd['name']}\n\n"
+    if scd["description"]:
+        head += f"{scd['description']}\n\n"
+    head += "| # | Category | Requirement | Product(s) | Links |\n|---|---|---|---|---|\n"
+    yield head.encode()
+    lines = []
+    for i, row in enumerate(rows, 1):
+        links = " ".join(f"[{label}](<{url}>)" for label, url in _links(row))
+        lines.append(f"| {i} | {_md_cell(row.category)} | {_md_cell(row.requirement)} | {_md_cell(row.product)} | {links} |\n")
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield "".join(lines).encode()
+            lines = []
+    yield "".join(lines).encode()
+
+
+def render_html(scd, rows):
+    name = html.escape(scd["name"])
+    head = (
+        f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{name}</title>\n"
+        "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+        "th,td{border:1px solid #ccc;padding:4px 8px;text-align:left;vertical-align:top}</style>\n"
+        f"</head>\n<body>\n<h1>{name}</h1>\n"
+    )
+    if scd["description"]:
+        head += f"<p>{html.escape(scd['description'])}</p>\n"
+    head += "<table>\n<thead><tr><th>#</th><th>Category</th><th>Requirement</th><th>Product(s)</th><th>Links</th></tr></thead>\n<tbody>\n"
+    yield head.encode()
+    lines = []
+    for i, row in enumerate(rows, 1):
+        links = " ".join(f"<a href=\"{html.escape(url)}\">{label}</a>" for label, url in _links(row))
+        lines.append(
+            f"<tr><td>{i}</td><td>{html.escape(row.category)}</td><td>{html.escape(row.requirement)}</td>"
+            f"<td>{html.escape(row.product or '')}</td><td>{links}</td></tr>\n"
+        )
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield "".join(lines).encode()
+            lines = []
+    lines.append("</tbody>\n</table>\n</body>\n</html>\n")
+    yield "".join(lines).encode()
+
+
+def render_xlsx(scd, rows):
+    # XLSX is a zip archive, so it is only complete once every row is written;
+    # write-only mode keeps openpyxl's memory use flat while it fills.
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title="Requirements")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(xlsx_row(sheet, row))
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    yield buffer.getvalue()
+
+
+RENDERERS = {"csv": render_csv, "xlsx": render_xlsx, "md": render_md, "html": render_html}
+
+
+def _artifact_key(scd, fmt):
+    return f"scd-export:{scd['id']}:{scd['updated_at'].isoformat()}:{fmt}"
+
+
+def cached_export(scd, fmt):
+    """A previously rendered export of this version of the document, or None."""
+    encoded = cache.get(_artifact_key(scd, fmt))
+    return base64.b64decode(encoded) if encoded is not None else None
+
+
+def stream_export(scd, fmt, read_only=False):
+    """Render an SCD, yielding bytes as rows arrive, and cache small complete artifacts.
+
+    `scd` holds the document's id, name, description and updated_at. Rows are
+    read in a session of their own, since streaming outlives the request's.
+    """
+    chunks = [] if cache.backend.shared else None
+    size = 0
+    for chunk in RENDERERS[fmt](scd, _rows(read_only, scd["id"])):
+        if chunks is not None:
+            size += len(chunk)
+            if size > ARTIFACT_CACHE_MAX_BYTES:
+                chunks = None
+            else:
+                chunks.append(chunk)
+        yield chunk
+    if chunks is not None:
+        # updated_at is part of the key, so edits never serve a stale artifact
+        cache.set(
+            _artifact_key(scd, fmt),
+            base64.b64encode(b"".join(chunks)).decode(),
+            ARTIFACT_CACHE_TTL,
+            tags=[f"scd:{scd['id']}"],
+        )
+
+
+# --- Requirement catalogue export ---
+
+REQUIREMENT_EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+# Bulk-upload columns first so exports re-import as they are; upload ignores the rest
+REQUIREMENT_EXPORT_COLUMNS = COLUMN_NAMES + ["id", "created_at", "created_by", "updated_at", "updated_by"]
+REQUIREMENT_EXPORT_BATCH_SIZE = 1000
+
+
+def _requirement_batches(read_only, categories, products, q):
+    """Filtered requirements in id order, in batches from a server-side cursor."""
+    where = ["TRUE"]
+    params = {}
+    if categories:
+        where.append("r.category = ANY(:categories)")
+        params["categories"] = list(categories)
+    if products:
+        where.append(f"{PRODUCTS_ARRAY_SQL} && CAST(:products AS text[])")
+        params["products"] = list(products)
+    if q:
+        where.append("r.requirement ILIKE :q")
+        params["q"] = f"%{q}%"
+    columns = ", ".join(f"r.{name}" for name in REQUIREMENT_EXPORT_COLUMNS)
+    with SessionLocal() as db:
+        db.info["read_only"] = read_only
+        result = db.execute(
+            text(f"SELECT {columns} FROM requirements r WHERE {' AND '.join(where)} ORDER BY r.id"),
+            params,
+            execution_options={"yield_per": REQUIREMENT_EXPORT_BATCH_SIZE},
+        )
+        yield from result.partitions()
+
+
+def _requirements_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REQUIREMENT_EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(["" if value is None else value for value in row] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _requirements_ndjson(batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps({name: _json_value(value) for name, value in zip(REQUIREMENT_EXPORT_COLUMNS, row)}) + "\n"
+            for row in batch
+        ).encode()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # Parquet records absolute offsets, so report the total written
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _requirements_parquet(batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema(
+        [(name, pa.string()) for name in COLUMN_NAMES]
+        + [
+            ("id", pa.int64()),
+            ("created_at", pa.timestamp("us")),
+            ("created_by", pa.string()),
+            ("updated_at", pa.timestamp("us")),
+            ("updated_by", pa.string()),
+        ]
+    )
+    sink = _Drain()
+    # One row group per batch, sent as soon as it is written
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+REQUIREMENT_RENDERERS = {"csv": _requirements_csv, "ndjson": _requirements_ndjson, "parquet": _requirements_parquet}
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_requirements_export(fmt, categories=None, products=None, q=None, compress=False, read_only=False):
+    """Stream the filtered catalogue as CSV, NDJSON or Parquet, optionally gzipped."""
+    chunks = REQUIREMENT_RENDERERS[fmt](_requirement_batches(read_only, categories, products, q))
+    return _gzip(chunks) if compress else chunks
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from collections import defaultdict
+from sqlalchemy import text
+from backend.db import engine
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache_invalidation"
+HEARTBEAT_INTERVAL = float(os.getenv("INVALIDATION_HEARTBEAT_INTERVAL", "5"))
+MAX_BACKOFF = 60
+
+
+class InvalidationBus:
+    """Cross-replica cache invalidation over Postgres LISTEN/NOTIFY.
+
+    Writers call publish() inside their transaction; Postgres delivers the
+    event to every replica (including the sender) once it commits. A listener
+    thread per replica calls the handlers subscribed to the event's table
+    with the changed key, or None for "anything in this table". Events sent
+    while a replica was disconnected are lost, so after every (re)connect all
+    flush handlers run before the listener resumes.
+    """
+
+    def __init__(self, channel=INVALIDATION_CHANNEL):
+        self.channel = channel
+        self.replica_id = uuid.uuid4().hex
+        self._handlers = defaultdict(list)
+        self._flush_handlers = []
+        self._thread = None
+        self._stopping = threading.Event()
+        self.connected = threading.Event()
+
+    def subscribe(self, table, handler, flush=None):
+        """handler(key) runs for each event on `table`; flush() after a gap (defaults to handler(None))."""
+        self._handlers[table].append(handler)
+        self._flush_handlers.append(flush or (lambda: handler(None)))
+
+    def publish(self, db, table, key=None):
+        """Queue an invalidation event in db's transaction; sent on commit."""
+        payload = json.dumps({"table": table, "key": key, "origin": self.replica_id})
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+
+    def dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+            table, key = event["table"], event.get("key")
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed invalidation event %r", payload)
+            return
+        for handler in self._handlers.get(table, []):
+            try:
+                handler(key)
+            except Exception:
+                logger.exception("Invalidation handler for %s failed", table)
+
+    def flush_all(self):
+        for flush in self._flush_handlers:
+            try:
+                flush()
+            except Exception:
+                logger.exception("Invalidation flush handler failed")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="invalidation-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _listen(self):
+        backoff = 1
+        while not self._stopping.is_set():
+            dbapi_connection = None
+            try:
+                # A dedicated connection outside the pool, held for LISTEN
+                cargs, cparams = engine.dialect.create_connect_args(engine.url)
+                dbapi_connection = engine.dialect.connect(*cargs, **cparams)
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # Anything sent while we were not listening was missed
+                self.flush_all()
+                self.connected.set()
+                backoff = 1
+                while not self._stopping.is_set():
+                    if select.select([dbapi_connection], [], [], HEARTBEAT_INTERVAL) == ([], [], []):
+                        # Idle: make sure the connection is still alive
+                        with dbapi_connection.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        self.dispatch(dbapi_connection.notifies.pop(0).payload)
+            except Exception:
+                self.connected.clear()
+                logger.exception("Invalidation listener failed; reconnecting in %ss", backoff)
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            finally:
+                if dbapi_connection is not None:
+                    try:
+                        dbapi_connection.close()
+                    except Exception:
+                        pass
+
+
+bus = InvalidationBus()
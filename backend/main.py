@@ -1,37 +1,81 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Body, Request, APIRouter, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, Body, Request, APIRouter, UploadFile, File, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from google.oauth2 import id_token
 from google.auth.transport import requests as grequests
 from pydantic import BaseModel, Field
 import os
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session, joinedload
-from backend.db import SessionLocal, User as DBUser, engine, Base, log_audit_action, Requirement, AuditLog, SuccessCriteriaDocument, SuccessCriteriaDocumentRequirement
-from sqlalchemy import and_, text, func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from backend.db import SessionLocal, User as DBUser, engine, Base, log_audit_action, Requirement, AuditLog, SuccessCriteriaDocument, SuccessCriteriaDocumentRequirement, SuccessCriteriaDocumentAccess
+from sqlalchemy import and_, text, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import time
 import sys
+import base64
+import importlib.util
 import platform
 import psutil
 import requests
-import csv
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
 import jwt
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import logging
 from sqlalchemy.exc import IntegrityError
+from backend.stats import requirement_stats, requirement_facets, requirements_changed
+from backend.search import search_requirements, search_scd_requirements
+from backend.texts import intern_texts, TEXT_FIELDS
+from backend.versions import document_snapshot, record_version, list_versions, get_version, version_diff
+from backend.acl import can_access, allows, owner_id
+from backend.audit import audit_details, touching, changing
+from backend.dedup import import_requirements, IMPORT_MODES
+from backend.settings import settings
+from backend.invalidation import bus
+from backend.cache import TTLCache, cache
+from backend.coalesce import coalesce, flights
+from backend.admission import AdmissionControl, request_principal
+from backend.replica import use_replica, mark_write
+from backend.requirement_files import parse_requirements_file, CSV_TEMPLATE, CSV_TEMPLATE_ETAG, etag, xlsx_template
+from backend.export import EXPORT_FORMATS, export_filename, cached_export, stream_export, REQUIREMENT_EXPORT_FORMATS, stream_requirements_export
+from backend.refresh_tokens import issue_refresh_token, rotate_refresh_token, revoke_refresh_token, RefreshTokenError
 
 load_dotenv()
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 DB_MANAGER_URL = os.getenv("DB_MANAGER_URL", "http://db-manager:8000/db-health")
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")  # In production, use a secure secret
-DEFAULT_SESSION_DURATION = int(os.getenv("DEFAULT_SESSION_DURATION", "3600"))  # 1 hour in seconds
 
 app = FastAPI()
+app.add_middleware(AdmissionControl, jwt_secret=JWT_SECRET)
 router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        await run_in_threadpool(mark_write, request_principal(request.scope, JWT_SECRET))
+    return response
+
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+
+# Authenticated users by email; evicted on every replica via the invalidation bus
+user_cache = TTLCache(ttl=USER_CACHE_TTL, maxsize=1024)
+bus.subscribe("users", lambda email: user_cache.delete(email) if email else user_cache.clear(), flush=user_cache.clear)
+
+@app.on_event("startup")
+def start_invalidation_bus():
+    try:
+        settings.load()
+    except Exception as e:
+        print("WARNING: Could not load settings, using defaults:", e)
+    bus.start()
+
+@app.on_event("shutdown")
+def stop_invalidation_bus():
+    bus.stop()
+
 # Create tables if they don't exist (for dev/demo)
 # Base.metadata.create_all(bind=engine)
 
@@ -60,6 +104,20 @@ class RequirementMassEdit(BaseModel):
     category: str | None = None
     product: str | None = None
 
+class RequirementPatch(BaseModel):
+    # Only the fields the client sends are changed
+    category: str | None = None
+    requirement: str | None = None
+    product: str | None = None
+    doc_link: str | None = None
+    tenant_link: str | None = None
+
+class RequirementBatchPatchItem(BaseModel):
+    id: int
+    fields: RequirementPatch
+    # When sent, the row is only updated if its updated_at still matches
+    updated_at: datetime | None = None
+
 class RequirementOut(RequirementIn):
     id: int
     created_at: datetime
@@ -110,6 +168,15 @@ def get_db():
     finally:
         db.close()
 
+# Dependency for read-only handlers; may read from the replica
+def get_read_db(request: Request):
+    db = SessionLocal()
+    db.info["read_only"] = use_replica(request_principal(request.scope, JWT_SECRET))
+    try:
+        yield db
+    finally:
+        db.close()
+
 # Dependency to get current user from Google ID token and DB
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -125,13 +192,21 @@ def get_current_user(
                 detail="Invalid authentication credentials. No email in token.",
             )
 
+        cached = user_cache.get(email)
+        if cached is not None:
+            return cached
         user = db.query(DBUser).filter(DBUser.email == email).first()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=f"User {email} not found",
             )
-        return User(email=user.email, name=user.name, picture=user.picture, role=user.role)
+        current = User(email=user.email, name=user.name, picture=user.picture, role=user.role)
+        user_cache.set(email, current)
+        # End the lookup's transaction so its connection goes back to the pool
+        # while the handler waits (e.g. on a coalesced flight)
+        db.rollback()
+        return current
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -183,6 +258,7 @@ def promote_user(
         raise HTTPException(status_code=404, detail="User not found")
     old_role = target.role
     target.role = "admin" if make_admin else "normal"
+    bus.publish(db, "users", email)
     db.commit()
     db.refresh(target)
     log_audit_action(
@@ -191,9 +267,25 @@ def promote_user(
         user_email=user.email,
         details=f"Changed {email} from {old_role} to {target.role}",
         ip_address=request.client.host if request else None,
+        details_json=audit_details("user", [email], fields=["role"], changes={"role": [old_role, target.role]}),
     )
     return {"email": target.email, "role": target.role}
 
+def create_access_token(email, role):
+    # Create a JWT token with expiration based on session duration
+    exp = datetime.utcnow() + timedelta(seconds=settings.get("session_duration"))
+    token = jwt.encode(
+        {
+            "sub": email,
+            "exp": exp,
+            "iat": datetime.utcnow(),
+            "role": role
+        },
+        JWT_SECRET,
+        algorithm="HS256"
+    )
+    return token, exp
+
 @router.post("/login")
 async def api_login(request: Request, db: Session = Depends(get_db)):
     print("Received /api/login request")
@@ -206,68 +298,102 @@ async def api_login(request: Request, db: Session = Depends(get_db)):
     try:
         idinfo = id_token.verify_oauth2_token(id_token_str, grequests.Request(), GOOGLE_CLIENT_ID)
         email = idinfo["email"]
-        user = db.query(DBUser).filter(DBUser.email == email).first()
-        if not user:
-            user = DBUser(
-                email=email,
-                name=idinfo.get("name"),
-                picture=idinfo.get("picture"),
-                role="normal",
-                created_at=datetime.utcnow(),
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        
-        user.last_login = datetime.utcnow()
-        db.commit()
-        
-        # Create a JWT token with expiration based on session duration
-        exp = datetime.utcnow() + timedelta(seconds=DEFAULT_SESSION_DURATION)
-        token = jwt.encode(
-            {
-                "sub": user.email,
-                "exp": exp,
-                "iat": datetime.utcnow(),
-                "role": user.role
-            },
-            JWT_SECRET,
-            algorithm="HS256"
-        )
-        
-        log_audit_action(
-            db,
-            action="login",
-            user_email=user.email,
-            details="User logged in",
-            ip_address=request.client.host if request else None,
-        )
-        return {
-            "email": user.email,
-            "name": user.name,
-            "picture": user.picture,
-            "role": user.role,
-            "token": token,
-            "expires_at": exp.isoformat(),
-        }
     except Exception as e:
         print("ERROR: Exception during token verification", e)
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
+    # Create or touch the user in one statement; concurrent first logins
+    # resolve through ON CONFLICT instead of racing on the unique email.
+    now = datetime.utcnow()
+    user = db.execute(
+        pg_insert(DBUser)
+        .values(
+            email=email,
+            name=idinfo.get("name"),
+            picture=idinfo.get("picture"),
+            role="normal",
+            created_at=now,
+            last_login=now,
+        )
+        .on_conflict_do_update(index_elements=[DBUser.email], set_={"last_login": now})
+        .returning(DBUser.id, DBUser.email, DBUser.name, DBUser.picture, DBUser.role)
+    ).one()
+
+    refresh_token, refresh_row = issue_refresh_token(db, user.id)
+    log_audit_action(
+        db,
+        action="login",
+        user_email=user.email,
+        details="User logged in",
+        ip_address=request.client.host if request else None,
+        commit=False,
+        details_json=audit_details("user", [user.email]),
+    )
+    # User upsert, refresh token and audit row commit together
+    db.commit()
+
+    token, exp = create_access_token(user.email, user.role)
+    return {
+        "email": user.email,
+        "name": user.name,
+        "picture": user.picture,
+        "role": user.role,
+        "token": token,
+        "expires_at": exp.isoformat(),
+        "refresh_token": refresh_token,
+        "refresh_expires_at": refresh_row.expires_at.isoformat(),
+    }
+
+class RefreshTokenIn(BaseModel):
+    refresh_token: str
+
+@router.post("/token/refresh")
+def refresh_access_token(data: RefreshTokenIn, db: Session = Depends(get_db)):
+    # Renews the session without another Google verification round trip
+    try:
+        user, refresh_token, refresh_row = rotate_refresh_token(db, data.refresh_token)
+    except RefreshTokenError as e:
+        db.rollback()
+        raise HTTPException(status_code=401, detail=str(e))
+    db.commit()
+
+    token, exp = create_access_token(user.email, user.role)
+    return {
+        "email": user.email,
+        "name": user.name,
+        "picture": user.picture,
+        "role": user.role,
+        "token": token,
+        "expires_at": exp.isoformat(),
+        "refresh_token": refresh_token,
+        "refresh_expires_at": refresh_row.expires_at.isoformat(),
+    }
+
+@router.post("/token/revoke")
+def revoke_token(data: RefreshTokenIn, db: Session = Depends(get_db)):
+    revoke_refresh_token(db, data.refresh_token)
+    db.commit()
+    return {"status": "revoked"}
+
 @router.get("/audit-logs")
 def get_audit_logs(
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     limit: int = 100,
     offset: int = 0,
     start_date: str = None,
     end_date: str = None,
     email: str = None,
     action: str = None,
+    entity: str = None,
+    entity_id: str = None,
+    field: str = None,
     request: Request = None,
 ):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
+    if entity_id is not None and not entity:
+        raise HTTPException(status_code=400, detail="entity_id requires entity")
     query = db.query(AuditLog)
     filters = []
     if start_date:
@@ -278,6 +404,13 @@ def get_audit_logs(
         filters.append(AuditLog.user_email.ilike(f"%{email}%"))
     if action:
         filters.append(AuditLog.action.ilike(f"%{action}%"))
+    # e.g. ?entity=requirement&entity_id=123 for every event touching requirement 123
+    if entity_id is not None:
+        filters.append(touching(entity, int(entity_id) if entity_id.isdigit() else entity_id))
+    elif entity:
+        filters.append(AuditLog.details_json.contains({"entity": entity}))
+    if field:
+        filters.append(changing(field))
     if filters:
         query = query.filter(and_(*filters))
     logs = query.order_by(AuditLog.timestamp.desc()).offset(offset).limit(limit).all()
@@ -288,6 +421,7 @@ def get_audit_logs(
             "user_email": log.user_email,
             "action": log.action,
             "details": log.details,
+            "details_json": log.details_json,
             "ip_address": log.ip_address,
         }
         for log in logs
@@ -296,6 +430,7 @@ def get_audit_logs(
 START_TIME = time.time()
 
 @router.get("/health")
+@coalesce()
 def health_check(db: Session = Depends(get_db)):
     # Check DB connectivity
     try:
@@ -315,6 +450,12 @@ def health_check(db: Session = Depends(get_db)):
         "total_memory_mb": int(psutil.virtual_memory().total / 1024 / 1024),
     }
 
+@router.get("/metrics/coalescing")
+def coalescing_metrics(user: User = Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return flights.stats()
+
 @router.get("/db-health")
 def proxy_db_health():
     try:
@@ -324,8 +465,76 @@ def proxy_db_health():
         return {"status": "error", "error": str(e)}
 
 @router.get("/requirements", response_model=list[RequirementOut])
-def list_requirements(db: Session = Depends(get_db)):
-    return db.query(Requirement).all()
+@coalesce()
+def list_requirements(db: Session = Depends(get_read_db)):
+    columns = [Requirement.__table__.c[name] for name in RequirementOut.model_fields]
+    return cache.get_or_load(
+        "requirements:list",
+        lambda: [dict(row) for row in db.execute(select(*columns)).mappings()],
+        tags=["requirements"],
+        replica=db.info.get("read_only", False),
+    )
+
+@router.get("/stats/requirements")
+@coalesce(per_user=False)
+def get_requirement_stats(recent_days: int = 7, db: Session = Depends(get_read_db), user: User = Depends(get_current_user)):
+    return requirement_stats(db, recent_days=recent_days)
+
+@router.get("/requirements/facets")
+def get_requirement_facets(
+    category: List[str] = Query([]),
+    product: List[str] = Query([]),
+    q: Optional[str] = None,
+    exclude_scd: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    if exclude_scd is not None:
+        # The counts reveal which requirements the document contains; callers
+        # without access get the same answer as for a missing document
+        accessible = db.query(SuccessCriteriaDocument.id).filter(
+            SuccessCriteriaDocument.id == exclude_scd, can_access(user.email)
+        ).first()
+        if accessible is None:
+            raise HTTPException(status_code=404, detail="Success Criteria Document not found")
+    return requirement_facets(db, categories=category, products=product, q=q, exclude_scd_id=exclude_scd)
+
+@router.get("/requirements/search")
+def search_requirements_endpoint(
+    q: str,
+    prefix: bool = False,
+    limit: int = Query(20, le=100),
+    offset: int = 0,
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    return search_requirements(db, q, limit=limit, offset=offset, prefix=prefix)
+
+@router.get("/requirements/export")
+def export_requirements(
+    format: str = "csv",
+    category: List[str] = Query([]),
+    product: List[str] = Query([]),
+    q: Optional[str] = None,
+    gzip: bool = False,
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    if format not in REQUIREMENT_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format '{format}', expected one of: {', '.join(REQUIREMENT_EXPORT_FORMATS)}")
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
+    media_type, extension = REQUIREMENT_EXPORT_FORMATS[format]
+    filename = f"requirements.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        stream_requirements_export(
+            format, categories=category, products=product, q=q, compress=gzip, read_only=db.info.get("read_only", False)
+        ),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.post("/requirements", response_model=RequirementOut)
 def add_requirement(req: RequirementIn, db: Session = Depends(get_db), user: User = Depends(get_current_user), request: Request = None):
@@ -342,7 +551,12 @@ def add_requirement(req: RequirementIn, db: Session = Depends(get_db), user: Use
         updated_by=user.email,
     )
     db.add(db_req)
-    db.commit()
+    try:
+        requirements_changed(db)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="An identical requirement already exists")
     db.refresh(db_req)
     log_audit_action(
         db,
@@ -350,6 +564,7 @@ def add_requirement(req: RequirementIn, db: Session = Depends(get_db), user: Use
         user_email=user.email,
         details=f"Added requirement id={db_req.id}, category={db_req.category}",
         ip_address=request.client.host if request else None,
+        details_json=audit_details("requirement", [db_req.id]),
     )
     return db_req
 
@@ -358,6 +573,7 @@ def edit_requirement(req_id: int, req: RequirementIn, db: Session = Depends(get_
     db_req = db.query(Requirement).filter(Requirement.id == req_id).first()
     if not db_req:
         raise HTTPException(status_code=404, detail="Requirement not found")
+    changed = [field for field in PATCHABLE_FIELDS if getattr(db_req, field) != getattr(req, field)]
     db_req.category = req.category
     db_req.requirement = req.requirement
     db_req.product = req.product
@@ -365,7 +581,12 @@ def edit_requirement(req_id: int, req: RequirementIn, db: Session = Depends(get_
     db_req.tenant_link = req.tenant_link
     db_req.updated_at = datetime.utcnow().isoformat()
     db_req.updated_by = user.email
-    db.commit()
+    try:
+        requirements_changed(db)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="An identical requirement already exists")
     db.refresh(db_req)
     log_audit_action(
         db,
@@ -373,6 +594,7 @@ def edit_requirement(req_id: int, req: RequirementIn, db: Session = Depends(get_
         user_email=user.email,
         details=f"Edited requirement id={db_req.id}, category={db_req.category}",
         ip_address=request.client.host if request else None,
+        details_json=audit_details("requirement", [db_req.id], fields=changed),
     )
     return db_req
 
@@ -382,6 +604,7 @@ def delete_requirement(req_id: int, db: Session = Depends(get_db), user: User =
     if not db_req:
         raise HTTPException(status_code=404, detail="Requirement not found")
     db.delete(db_req)
+    requirements_changed(db)
     db.commit()
     log_audit_action(
         db,
@@ -389,45 +612,50 @@ def delete_requirement(req_id: int, db: Session = Depends(get_db), user: User =
         user_email=user.email,
         details=f"Deleted requirement id={req_id}",
         ip_address=request.client.host if request else None,
+        details_json=audit_details("requirement", [req_id]),
     )
     return {"status": "deleted"}
 
 @router.post("/requirements/bulk-upload")
-def bulk_upload_requirements(file: UploadFile = File(...), db: Session = Depends(get_db), user: User = Depends(get_current_user), request: Request = None):
+def bulk_upload_requirements(
+    file: UploadFile = File(...),
+    mode: str = Query("skip"),
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    request: Request = None,
+):
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode '{mode}', expected one of: {', '.join(IMPORT_MODES)}")
     try:
-        content = file.file.read().decode('utf-8')
-        reader = csv.DictReader(content.splitlines())
-        now = datetime.utcnow()
-        new_reqs = []
-        for i, row in enumerate(reader, 1):
-            # Validate required fields
-            if not row.get('category') or not row.get('requirement'):
-                raise HTTPException(status_code=400, detail=f"Row {i} missing required fields: category and requirement")
-            db_req = Requirement(
-                category=row.get('category', ''),
-                requirement=row.get('requirement', ''),
-                product=row.get('product', None),
-                doc_link=row.get('doc_link', None),
-                tenant_link=row.get('tenant_link', None),
-                created_at=now,
-                created_by=user.email
-            )
-            db.add(db_req)
-            new_reqs.append(db_req)
+        try:
+            rows = parse_requirements_file(file.filename, file.file.read())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        result = import_requirements(db, rows, user.email, mode=mode, dry_run=dry_run)
+        if dry_run:
+            return result
+        requirements_changed(db)
         db.commit()
 
-        for req in new_reqs:
-            db.refresh(req)
-
         log_audit_action(
             db,
             action="bulk_upload_requirements",
             user_email=user.email,
-            details=f"Bulk uploaded {len(new_reqs)} requirements from file {file.filename}",
+            details=f"Bulk uploaded {result['count']} requirements from file {file.filename} "
+                    f"(mode={mode}, updated={result['updated']}, duplicates={result['duplicates']}, near_duplicates={result['near_duplicates']})",
             ip_address=request.client.host if request else None,
+            details_json=audit_details(
+                "requirement", file=file.filename, mode=mode, count=result["count"], updated=result["updated"],
+                duplicates=result["duplicates"], near_duplicates=result["near_duplicates"],
+            ),
         )
 
-        return {"count": len(new_reqs)}
+        return result
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to process CSV file: {str(e)}")
@@ -440,18 +668,21 @@ def mass_delete_requirements(ids: list[int] = Body(...), db: Session = Depends(g
         return {"deleted": 0}
 
     num_deleted = len(reqs_to_delete)
+    deleted_ids = [req.id for req in reqs_to_delete]
 
     for req in reqs_to_delete:
         db.delete(req)
         
+    requirements_changed(db)
     db.commit()
 
     log_audit_action(
         db,
         action="mass_delete_requirements",
         user_email=user.email,
-        details=f"Mass deleted requirements ids={ids}",
+        details=f"Mass deleted {num_deleted} requirements",
         ip_address=request.client.host if request else None,
+        details_json=audit_details("requirement", deleted_ids),
     )
     return {"deleted": num_deleted}
 
@@ -467,43 +698,156 @@ def mass_edit_requirements(
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
         
-    query = db.query(Requirement).filter(Requirement.id.in_(ids))
-    
-    update_data = updates.dict(exclude_unset=True)
-    update_data["updated_at"] = datetime.utcnow()
-    update_data["updated_by"] = user.email
-
-    updated_count = query.update(update_data, synchronize_session=False)
+    changes = updates.model_dump(exclude_unset=True)
+    statement = (
+        update(Requirement)
+        .where(Requirement.id.in_(ids))
+        .values(**changes, updated_at=datetime.utcnow(), updated_by=user.email)
+        .returning(Requirement.id)
+    )
+    updated_ids = db.execute(statement).scalars().all()
+    updated_count = len(updated_ids)
+    requirements_changed(db)
     db.commit()
 
     log_audit_action(
         db,
         action="mass_edit_requirements",
         user_email=user.email,
-        details=f"Mass edited {updated_count} requirements with updates: {updates.dict(exclude_unset=True)} on IDs: {ids}",
+        details=f"Mass edited {updated_count} requirements",
+        # Old values differ per row, so only the new ones are recorded
+        details_json=audit_details(
+            "requirement", updated_ids, fields=list(updates.model_fields_set),
+            changes={field: [None, value] for field, value in changes.items()},
+        ),
     )
     
     return {"message": f"Successfully updated {updated_count} requirements."}
 
-@router.get("/requirements/template")
-def download_template():
-    output = [
-        ["category", "requirement", "product", "doc_link", "tenant_link"],
-        ["General", "This is an example requirement.", "Product A", "http://docs.example.com/a", "http://tenant.example.com/a"],
-    ]
-    
-    # Using Response to manually set headers
-    content = ""
-    with open('temp_template.csv', 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(output)
-    
-    with open('temp_template.csv', 'r') as f:
-        content = f.read()
-        
-    os.remove('temp_template.csv')
+PATCHABLE_FIELDS = ["category", "requirement", "product", "doc_link", "tenant_link"]
 
-    return Response(content=content, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=requirements_template.csv"})
+@router.post("/requirements/batch-patch", response_model=list[RequirementOut])
+def batch_patch_requirements(
+    items: list[RequirementBatchPatchItem] = Body(...),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    request: Request = None,
+):
+    if not items:
+        raise HTTPException(status_code=400, detail="No requirement patches provided.")
+    if len({item.id for item in items}) != len(items):
+        raise HTTPException(status_code=400, detail="Each requirement may only appear once per batch.")
+
+    # Build one VALUES row per item: the new value and a "was sent" flag for
+    # each field, plus the expected updated_at for the optimistic check.
+    values = []
+    params = {"now": datetime.utcnow(), "user_email": user.email}
+    for i, item in enumerate(items):
+        sent = item.fields.model_fields_set
+        for field in ("category", "requirement"):
+            if field in sent and getattr(item.fields, field) is None:
+                raise HTTPException(status_code=400, detail=f"Requirement {item.id}: {field} cannot be null")
+        expected = item.updated_at
+        if expected is not None and expected.tzinfo is not None:
+            expected = expected.astimezone(timezone.utc).replace(tzinfo=None)
+        params[f"id_{i}"] = item.id
+        params[f"check_{i}"] = "updated_at" in item.model_fields_set
+        params[f"expected_{i}"] = expected
+        row = [f"CAST(:id_{i} AS integer)", f"CAST(:check_{i} AS boolean)", f"CAST(:expected_{i} AS timestamp)"]
+        for field in PATCHABLE_FIELDS:
+            params[f"{field}_{i}"] = getattr(item.fields, field)
+            params[f"set_{field}_{i}"] = field in sent
+            row += [f"CAST(:{field}_{i} AS varchar)", f"CAST(:set_{field}_{i} AS boolean)"]
+        values.append(f"({', '.join(row)})")
+
+    columns = ["id", "check_version", "expected_updated_at"]
+    for field in PATCHABLE_FIELDS:
+        columns += [field, f"set_{field}"]
+    assignments = ",\n".join(
+        f"{field} = CASE WHEN v.set_{field} THEN v.{field} ELSE r.{field} END" for field in PATCHABLE_FIELDS
+    )
+    statement = text(f"""
+        UPDATE requirements AS r
+        SET {assignments},
+            updated_at = :now,
+            updated_by = :user_email
+        FROM (VALUES {', '.join(values)}) AS v({', '.join(columns)})
+        WHERE r.id = v.id
+          AND (NOT v.check_version OR r.updated_at IS NOT DISTINCT FROM v.expected_updated_at)
+        RETURNING r.id
+    """)
+
+    try:
+        updated_ids = set(db.execute(statement, params).scalars().all())
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A patch would make a requirement identical to an existing one")
+
+    # All or nothing: rows that were not updated are either gone or were
+    # changed by someone else since the client read them.
+    missing = [item.id for item in items if item.id not in updated_ids]
+    if missing:
+        db.rollback()
+        existing = {row.id for row in db.query(Requirement.id).filter(Requirement.id.in_(missing)).all()}
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "Batch not applied; some requirements were modified or deleted since they were read.",
+                "conflicts": [i for i in missing if i in existing],
+                "not_found": [i for i in missing if i not in existing],
+            },
+        )
+
+    requirements_changed(db)
+    db.commit()
+
+    log_audit_action(
+        db,
+        action="batch_patch_requirements",
+        user_email=user.email,
+        details=f"Batch patched {len(updated_ids)} requirements",
+        ip_address=request.client.host if request else None,
+        details_json=audit_details(
+            "requirement", updated_ids, fields={field for item in items for field in item.fields.model_fields_set},
+        ),
+    )
+
+    return db.query(Requirement).filter(Requirement.id.in_(updated_ids)).order_by(Requirement.id).all()
+
+@router.get("/requirements/template")
+def download_template(request: Request):
+    headers = {
+        "Content-Disposition": "attachment; filename=requirements_template.csv",
+        "Cache-Control": "public, max-age=86400",
+        "ETag": CSV_TEMPLATE_ETAG,
+    }
+    if request.headers.get("if-none-match") == CSV_TEMPLATE_ETAG:
+        return Response(status_code=304, headers=headers)
+    return Response(content=CSV_TEMPLATE, media_type="text/csv", headers=headers)
+
+@router.get("/requirements/template/xlsx")
+def download_xlsx_template(request: Request, db: Session = Depends(get_read_db), user: User = Depends(get_current_user)):
+    def build():
+        facets = requirement_facets(db)
+        content = xlsx_template([f["value"] for f in facets["categories"]], [f["value"] for f in facets["products"]])
+        return {"etag": etag(content), "content": base64.b64encode(content).decode()}
+
+    # Rebuilt only when requirements change, since the dropdowns come from the facets
+    template = cache.get_or_load(
+        "requirements:template:xlsx", build, tags=["requirements"], replica=db.info.get("read_only", False)
+    )
+    headers = {
+        "Content-Disposition": "attachment; filename=requirements_template.xlsx",
+        "Cache-Control": "private, max-age=3600",
+        "ETag": template["etag"],
+    }
+    if request.headers.get("if-none-match") == template["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=base64.b64decode(template["content"]),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers,
+    )
 
 # --- Success Criteria Document Endpoints ---
 
@@ -524,13 +868,18 @@ def create_scd(
         owner_id=db_user.id
     )
 
-    for req_in in scd_in.requirements:
+    hashes = intern_texts(db, [req_in.dict() for req_in in scd_in.requirements])
+    for req_in, text_hash in zip(scd_in.requirements, hashes):
         new_req = SuccessCriteriaDocumentRequirement(
-            **req_in.dict()
+            text_hash=text_hash,
+            original_requirement_id=req_in.original_requirement_id,
+            order=req_in.order,
         )
         new_scd.requirements.append(new_req)
     
     db.add(new_scd)
+    db.flush()
+    record_version(db, new_scd.id, user.email)
     db.commit()
     db.refresh(new_scd)
 
@@ -539,7 +888,8 @@ def create_scd(
         "create_scd",
         user.email,
         f"Created SCD '{new_scd.name}' (ID: {new_scd.id})",
-        request.client.host if request else None
+        request.client.host if request else None,
+        details_json=audit_details("scd", [new_scd.id]),
     )
 
     return new_scd
@@ -547,7 +897,7 @@ def create_scd(
 @router.get("/scd", response_model=List[SCDOut])
 def list_scds(
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     db_user = db.query(DBUser).filter(DBUser.email == user.email).first()
     if not db_user:
@@ -556,20 +906,54 @@ def list_scds(
     scds = db.query(SuccessCriteriaDocument).filter(SuccessCriteriaDocument.owner_id == db_user.id).all()
     return scds
 
+@router.get("/scd/shared", response_model=List[SCDOut])
+def list_shared_scds(
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    # Walks ix_scd_acl_principal_document_id for the caller's entries
+    return db.query(SuccessCriteriaDocument).options(
+        joinedload(SuccessCriteriaDocument.owner),
+        selectinload(SuccessCriteriaDocument.requirements),
+    ).join(
+        SuccessCriteriaDocumentAccess, SuccessCriteriaDocumentAccess.document_id == SuccessCriteriaDocument.id
+    ).filter(SuccessCriteriaDocumentAccess.principal == user.email).order_by(SuccessCriteriaDocument.updated_at.desc()).all()
+
+def scd_access_error(db, scd_id, action="view"):
+    # Only called when the access-checked query returned nothing
+    if db.query(SuccessCriteriaDocument.id).filter(SuccessCriteriaDocument.id == scd_id).first() is None:
+        return HTTPException(status_code=404, detail="Success Criteria Document not found")
+    return HTTPException(status_code=403, detail=f"You do not have permission to {action} this document.")
+
+def authorize_scd(db, scd_id, user, permission="view"):
+    found = db.query(SuccessCriteriaDocument.id).filter(
+        SuccessCriteriaDocument.id == scd_id, can_access(user.email, permission)
+    ).first()
+    if found is None:
+        raise scd_access_error(db, scd_id, "modify" if permission != "view" else "view")
+    return scd_id
+
 @router.get("/scd/{scd_id}", response_model=SCDOut)
+@coalesce()
 def get_scd(
     scd_id: int,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    scd = db.query(SuccessCriteriaDocument).filter(SuccessCriteriaDocument.id == scd_id).first()
-
-    if not scd:
-        raise HTTPException(status_code=404, detail="Success Criteria Document not found")
-
-    # For now, only the owner can view. We can add sharing logic later.
-    db_user = db.query(DBUser).filter(DBUser.email == user.email).first()
-    if not db_user or scd.owner_id != db_user.id:
+    def load():
+        scd = db.query(SuccessCriteriaDocument).options(
+            joinedload(SuccessCriteriaDocument.owner),
+            selectinload(SuccessCriteriaDocument.requirements),
+            selectinload(SuccessCriteriaDocument.acl),
+        ).filter(SuccessCriteriaDocument.id == scd_id).first()
+        if not scd:
+            raise HTTPException(status_code=404, detail="Success Criteria Document not found")
+        # The ACL is cached with the document, so cache hits authorize without a query
+        return {**SCDOut.model_validate(scd).model_dump(), "acl": {entry.principal: entry.permission for entry in scd.acl}}
+
+    scd = cache.get_or_load(f"scd:{scd_id}", load, tags=[f"scd:{scd_id}"])
+
+    if not allows(scd, user.email):
         raise HTTPException(status_code=403, detail="You do not have permission to view this document.")
 
     return scd
@@ -581,50 +965,90 @@ def clone_scd(
     db: Session = Depends(get_db),
     request: Request = None
 ):
-    # Use joinedload to efficiently fetch the document and its requirements in one query
+    # Use joinedload to efficiently fetch the document and its requirements in one query;
+    # the clone only needs their text hashes, not the texts
     original_scd = db.query(SuccessCriteriaDocument).options(
-        joinedload(SuccessCriteriaDocument.requirements)
-    ).filter(SuccessCriteriaDocument.id == scd_id).first()
+        joinedload(SuccessCriteriaDocument.requirements).lazyload(SuccessCriteriaDocumentRequirement.text)
+    ).filter(SuccessCriteriaDocument.id == scd_id, can_access(user.email)).first()
 
     if not original_scd:
-        raise HTTPException(status_code=404, detail="SCD not found")
-        
-    db_user = db.query(DBUser).filter(DBUser.email == user.email).first()
-    if not db_user or original_scd.owner_id != db_user.id:
-        raise HTTPException(status_code=403, detail="You do not have permission to clone this document.")
+        raise scd_access_error(db, scd_id, "clone")
 
     # Create the new document, assigning the current user as the owner
     cloned_scd = SuccessCriteriaDocument(
         name=f"[CLONE] {original_scd.name}",
         description=original_scd.description,
-        owner_id=db_user.id,
+        owner_id=owner_id(user.email),
     )
     
-    # Create new requirement instances, copying the data from the originals
+    # Create new requirement instances sharing the originals' texts
     cloned_scd.requirements = [
         SuccessCriteriaDocumentRequirement(
-            category=original_req.category,
-            requirement=original_req.requirement,
-            product=original_req.product,
-            doc_link=original_req.doc_link,
-            tenant_link=original_req.tenant_link,
+            text_hash=original_req.text_hash,
             original_requirement_id=original_req.original_requirement_id,
             order=original_req.order
         ) for original_req in original_scd.requirements
     ]
         
     db.add(cloned_scd)
+    db.flush()
+    record_version(db, cloned_scd.id, user.email)
     db.commit()
     db.refresh(cloned_scd)
     
     log_audit_action(
         db, "clone_scd", user.email,
         f"Cloned SCD '{original_scd.name}' (ID: {original_scd.id}) to new SCD '{cloned_scd.name}' (ID: {cloned_scd.id})",
-        request.client.host if request else None
+        request.client.host if request else None,
+        details_json=audit_details("scd", [original_scd.id, cloned_scd.id], source_id=original_scd.id),
     )
 
     return cloned_scd
 
+@router.get("/scd/{scd_id}/export")
+def export_scd(
+    scd_id: int,
+    format: str = "csv",
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format '{format}', expected one of: {', '.join(EXPORT_FORMATS)}")
+
+    doc = db.query(
+        SuccessCriteriaDocument.id,
+        SuccessCriteriaDocument.name,
+        SuccessCriteriaDocument.description,
+        SuccessCriteriaDocument.updated_at,
+    ).filter(SuccessCriteriaDocument.id == scd_id, can_access(user.email)).first()
+    if not doc:
+        raise scd_access_error(db, scd_id)
+
+    scd = {"id": doc.id, "name": doc.name, "description": doc.description, "updated_at": doc.updated_at}
+    media_type = EXPORT_FORMATS[format][0]
+    headers = {"Content-Disposition": f'attachment; filename="{export_filename(doc.name, format)}"'}
+    artifact = cached_export(scd, format)
+    if artifact is not None:
+        return Response(content=artifact, media_type=media_type, headers=headers)
+    return StreamingResponse(
+        stream_export(scd, format, read_only=db.info.get("read_only", False)),
+        media_type=media_type,
+        headers=headers,
+    )
+
+@router.get("/scd/{scd_id}/search")
+def search_scd(
+    scd_id: int,
+    q: str,
+    prefix: bool = False,
+    limit: int = Query(20, le=100),
+    offset: int = 0,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    authorize_scd(db, scd_id, user)
+    return search_scd_requirements(db, scd_id, q, limit=limit, offset=offset, prefix=prefix)
+
 class UpdateSCDRequirementsIn(BaseModel):
     requirement_ids: List[int]
 
@@ -635,14 +1059,14 @@ def add_requirements_to_scd(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Fetch the document and check ownership
-    scd = db.query(SuccessCriteriaDocument).filter(SuccessCriteriaDocument.id == scd_id).first()
+    # Fetch the document if the user owns it or it is shared with them for editing
+    scd = db.query(SuccessCriteriaDocument).filter(
+        SuccessCriteriaDocument.id == scd_id, can_access(user.email, "edit")
+    ).first()
     if not scd:
-        raise HTTPException(status_code=404, detail="SCD not found")
-    
-    db_user = db.query(DBUser).filter(DBUser.email == user.email).first()
-    if not db_user or scd.owner_id != db_user.id:
-        raise HTTPException(status_code=403, detail="You do not have permission to modify this document.")
+        raise scd_access_error(db, scd_id, "modify")
+
+    before = document_snapshot(db, scd_id, lock=True)
 
     # Get the highest current order
     highest_order = db.query(func.max(SuccessCriteriaDocumentRequirement.order)).filter_by(document_id=scd_id).scalar() or -1
@@ -652,25 +1076,144 @@ def add_requirements_to_scd(
     if len(master_requirements) != len(data.requirement_ids):
         raise HTTPException(status_code=404, detail="One or more master requirements not found.")
 
-    for i, master_req in enumerate(master_requirements):
+    hashes = intern_texts(db, [
+        {field: getattr(master_req, field) for field in TEXT_FIELDS} for master_req in master_requirements
+    ])
+    for i, (master_req, text_hash) in enumerate(zip(master_requirements, hashes)):
         new_req = SuccessCriteriaDocumentRequirement(
             document_id=scd_id,
-            category=master_req.category,
-            requirement=master_req.requirement,
-            product=master_req.product,
-            doc_link=master_req.doc_link,
-            tenant_link=master_req.tenant_link,
+            text_hash=text_hash,
             original_requirement_id=master_req.id,
             order=highest_order + 1 + i
         )
         db.add(new_req)
 
     scd.updated_at = datetime.utcnow()
+    record_version(db, scd_id, user.email, before)
+    cache.invalidate(db, f"scd:{scd_id}")
     db.commit()
     db.refresh(scd)
 
     return scd
 
+@router.get("/scd/{scd_id}/versions")
+def get_scd_versions(
+    scd_id: int,
+    limit: int = Query(50, le=500),
+    offset: int = 0,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    return list_versions(db, authorize_scd(db, scd_id, user), limit=limit, offset=offset)
+
+@router.get("/scd/{scd_id}/versions/{version}")
+def get_scd_version(
+    scd_id: int,
+    version: int,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    result = get_version(db, authorize_scd(db, scd_id, user), version)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return result
+
+@router.get("/scd/{scd_id}/diff")
+def get_scd_diff(
+    scd_id: int,
+    from_version: int = Query(..., alias="from"),
+    to_version: int = Query(..., alias="to"),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    result = version_diff(db, authorize_scd(db, scd_id, user), from_version, to_version)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return result
+
+class SCDShareIn(BaseModel):
+    principal: str  # the user's email
+    permission: Literal["view", "edit"] = "view"
+
+class SCDShareOut(SCDShareIn):
+    created_at: datetime
+    created_by: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+@router.get("/scd/{scd_id}/acl", response_model=List[SCDShareOut])
+def get_scd_acl(
+    scd_id: int,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    authorize_scd(db, scd_id, user, "owner")
+    return db.query(SuccessCriteriaDocumentAccess).filter(
+        SuccessCriteriaDocumentAccess.document_id == scd_id
+    ).order_by(SuccessCriteriaDocumentAccess.principal).all()
+
+@router.put("/scd/{scd_id}/acl", response_model=SCDShareOut)
+def share_scd(
+    scd_id: int,
+    share: SCDShareIn,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    request: Request = None
+):
+    authorize_scd(db, scd_id, user, "owner")
+    if share.principal == user.email:
+        raise HTTPException(status_code=400, detail="You already own this document.")
+    if not db.query(DBUser.id).filter(DBUser.email == share.principal).first():
+        raise HTTPException(status_code=404, detail="User not found")
+
+    now = datetime.utcnow()
+    entry = db.execute(
+        pg_insert(SuccessCriteriaDocumentAccess)
+        .values(document_id=scd_id, principal=share.principal, permission=share.permission, created_at=now, created_by=user.email)
+        .on_conflict_do_update(
+            index_elements=[SuccessCriteriaDocumentAccess.document_id, SuccessCriteriaDocumentAccess.principal],
+            set_={"permission": share.permission, "created_at": now, "created_by": user.email},
+        )
+        .returning(SuccessCriteriaDocumentAccess)
+    ).scalar_one()
+    log_audit_action(
+        db, "share_scd", user.email,
+        f"Shared SCD {scd_id} with {share.principal} ({share.permission})",
+        request.client.host if request else None,
+        commit=False,
+        details_json=audit_details("scd", [scd_id], principal=share.principal, permission=share.permission),
+    )
+    cache.invalidate(db, f"scd:{scd_id}")
+    db.commit()
+    return entry
+
+@router.delete("/scd/{scd_id}/acl/{principal}")
+def unshare_scd(
+    scd_id: int,
+    principal: str,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    request: Request = None
+):
+    authorize_scd(db, scd_id, user, "owner")
+    deleted = db.query(SuccessCriteriaDocumentAccess).filter(
+        SuccessCriteriaDocumentAccess.document_id == scd_id,
+        SuccessCriteriaDocumentAccess.principal == principal,
+    ).delete()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="This document is not shared with that user.")
+    log_audit_action(
+        db, "unshare_scd", user.email,
+        f"Stopped sharing SCD {scd_id} with {principal}",
+        request.client.host if request else None,
+        commit=False,
+        details_json=audit_details("scd", [scd_id], principal=principal),
+    )
+    cache.invalidate(db, f"scd:{scd_id}")
+    db.commit()
+    return {"status": "unshared"}
+
 class SessionConfig(BaseModel):
     duration: int  # Session duration in seconds
 
@@ -678,25 +1221,27 @@ class SessionConfig(BaseModel):
 def get_session_config(user: User = Depends(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
-    return {"duration": DEFAULT_SESSION_DURATION}
+    return {"duration": settings.get("session_duration")}
 
 @router.post("/session-config")
-def update_session_config(config: SessionConfig, user: User = Depends(get_current_user), request: Request = None):
-    # This is a mock update as we can't persist this setting easily without a dedicated settings table
-    # For now, we can just log the attempt
-    global DEFAULT_SESSION_DURATION
+def update_session_config(config: SessionConfig, user: User = Depends(get_current_user), db: Session = Depends(get_db), request: Request = None):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
+    if config.duration <= 0:
+        raise HTTPException(status_code=400, detail="Session duration must be positive")
     
-    old_duration = DEFAULT_SESSION_DURATION
-    DEFAULT_SESSION_DURATION = config.duration
+    old_duration = settings.get("session_duration")
+    settings.set(db, "session_duration", config.duration, user_email=user.email)
     
     log_audit_action(
-        db=next(get_db()),
+        db,
         action="update_session_config",
         user_email=user.email,
         details=f"Changed session duration from {old_duration}s to {config.duration}s",
         ip_address=request.client.host if request else None,
+        details_json=audit_details(
+            "setting", ["session_duration"], fields=["value"], changes={"value": [old_duration, config.duration]},
+        ),
     )
     return {"message": f"Session duration updated to {config.duration} seconds. This will apply to new logins."}
 
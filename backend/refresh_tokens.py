@@ -0,0 +1,77 @@
+import hashlib
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from backend.db import RefreshToken
+
+REFRESH_TOKEN_DURATION = int(os.getenv("REFRESH_TOKEN_DURATION", str(30 * 24 * 3600)))  # 30 days in seconds
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+def hash_token(token):
+    # Tokens are 256 random bits, so an unsalted hash is enough to make a
+    # leaked table useless
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(db, user_id, family_id=None):
+    """Add a new refresh token for user_id to the session; returns (token, row)."""
+    token = secrets.token_urlsafe(32)
+    row = RefreshToken(
+        user_id=user_id,
+        token_hash=hash_token(token),
+        family_id=family_id or uuid.uuid4().hex,
+        created_at=datetime.utcnow(),
+        expires_at=datetime.utcnow() + timedelta(seconds=REFRESH_TOKEN_DURATION),
+    )
+    db.add(row)
+    return token, row
+
+
+def revoke_family(db, family_id):
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None),
+    ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+
+
+def rotate_refresh_token(db, token):
+    """Exchange a refresh token for a new one in the same family.
+
+    Presenting a token that was already rotated means it was copied, so the
+    whole family is revoked. Raises RefreshTokenError for any invalid token;
+    the caller must commit.
+    """
+    current = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == hash_token(token))
+        .with_for_update()
+        .first()
+    )
+    if not current:
+        raise RefreshTokenError("Invalid refresh token")
+    if current.revoked_at is not None:
+        if current.replaced_by_id is not None:
+            revoke_family(db, current.family_id)
+            db.commit()
+            raise RefreshTokenError("Refresh token reuse detected; all sessions from this login were revoked")
+        raise RefreshTokenError("Refresh token has been revoked")
+    if current.expires_at < datetime.utcnow():
+        raise RefreshTokenError("Refresh token has expired")
+
+    new_token, new_row = issue_refresh_token(db, current.user_id, current.family_id)
+    db.flush()
+    current.revoked_at = datetime.utcnow()
+    current.replaced_by_id = new_row.id
+    return current.user, new_token, new_row
+
+
+def revoke_refresh_token(db, token):
+    """Revoke the family of `token` (logout). Unknown tokens are ignored."""
+    current = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_token(token)).first()
+    if current:
+        revoke_family(db, current.family_id)
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+import time
+from sqlalchemy import text
+from backend.db import engine, replica_engine, REPLICA_MAX_LAG
+from backend.cache import cache
+from backend.invalidation import bus
+
+logger = logging.getLogger(__name__)
+
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "1"))
+READ_YOUR_WRITES_WINDOW = int(os.getenv("READ_YOUR_WRITES_WINDOW", "10"))
+
+# Zero when everything received has been replayed, so an idle primary does
+# not look like lag; NULL (treated as zero) when the server is not a standby.
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class LagMonitor:
+    def __init__(self, engine, max_lag, interval):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def healthy(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.interval and self._lock.acquire(blocking=False):
+            # One request refreshes the lag; the rest use the last value
+            try:
+                self._checked_at = now
+                self.lag = self._measure()
+            finally:
+                self._lock.release()
+        return self.lag is not None and self.lag <= self.max_lag
+
+    def _measure(self):
+        try:
+            with self.engine.connect() as connection:
+                return float(connection.execute(text(REPLICA_LAG_SQL)).scalar() or 0)
+        except Exception as e:
+            logger.warning("Replica lag check failed; reading from the primary: %s", e)
+            return None
+
+
+lag_monitor = LagMonitor(replica_engine, REPLICA_MAX_LAG, REPLICA_LAG_CHECK_INTERVAL) if replica_engine is not None else None
+
+
+def _pin(principal):
+    if principal:
+        cache.set(f"wrote:{principal}", True, READ_YOUR_WRITES_WINDOW)
+
+
+# With a per-process cache every API process keeps its own markers
+bus.subscribe("wrote", _pin, flush=lambda: None)
+
+
+def mark_write(principal):
+    """Pin the principal's reads to the primary for READ_YOUR_WRITES_WINDOW seconds.
+
+    The marker lives in the cache; when that is not shared between API
+    processes it is also sent to the others over the invalidation bus.
+    """
+    if lag_monitor is None:
+        return
+    _pin(principal)
+    if not cache.backend.shared:
+        try:
+            with engine.begin() as connection:
+                bus.publish(connection, "wrote", principal)
+        except Exception as e:
+            logger.warning("Could not send the write marker to other processes: %s", e)
+
+
+def use_replica(principal):
+    """Whether this principal's read-only session may read from the replica.
+
+    Set REPLICA_DATABASE_URL to a streaming replica of DATABASE_URL to enable
+    it. The primary is used instead when the replica is unreachable or more
+    than REPLICA_MAX_LAG seconds behind (checked at most every
+    REPLICA_LAG_CHECK_INTERVAL seconds), and for READ_YOUR_WRITES_WINDOW
+    seconds after the principal's own writes. A primary plus a local standby
+    started from pg_basebackup -R is enough to try it.
+    """
+    if lag_monitor is None:
+        return False
+    if cache.get(f"wrote:{principal}") is not None:
+        return False
+    return lag_monitor.healthy()
@@ -0,0 +1,194 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+from typing import NamedTuple
+
+
+class CsvColumn(NamedTuple):
+    name: str
+    required: bool
+    example: str
+    description: str
+
+
+# The requirement file format, shared by the bulk-upload parser, the
+# templates and the exports. Order is the column order of generated files.
+REQUIREMENT_COLUMNS = [
+    CsvColumn("category", True, "General", "Requirement category"),
+    CsvColumn("requirement", True, "This is an example requirement.", "Requirement text"),
+    CsvColumn("product", False, "Product A", "Products, separated by commas"),
+    CsvColumn("doc_link", False, "http://docs.example.com/a", "Documentation link"),
+    CsvColumn("tenant_link", False, "http://tenant.example.com/a", "Tenant link"),
+]
+COLUMN_NAMES = [column.name for column in REQUIREMENT_COLUMNS]
+REQUIRED_COLUMNS = [column.name for column in REQUIREMENT_COLUMNS if column.required]
+
+
+def _validated_rows(fieldnames, records):
+    missing = [name for name in REQUIRED_COLUMNS if name not in (fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    rows = []
+    for i, record in enumerate(records, 1):
+        if any(not record.get(name) for name in REQUIRED_COLUMNS):
+            raise ValueError(f"Row {i} missing required fields: {' and '.join(REQUIRED_COLUMNS)}")
+        rows.append({"row_num": i, **{name: record.get(name) or None for name in COLUMN_NAMES}})
+    return rows
+
+
+def parse_requirements_csv(content):
+    """Rows of an uploaded requirements CSV; raises ValueError on invalid input.
+
+    Empty optional cells become None.
+    """
+    reader = csv.DictReader(io.StringIO(content, newline=""))
+    return _validated_rows(reader.fieldnames, reader)
+
+
+def parse_requirements_xlsx(data):
+    """Rows of the first sheet of an uploaded XLSX file, validated like a CSV."""
+    from openpyxl import load_workbook
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        values = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(values, ())]
+        records = (
+            {name: str(cell).strip() if cell is not None else None for name, cell in zip(header, row)}
+            for row in values
+            if any(cell is not None for cell in row)
+        )
+        return _validated_rows(header, records)
+    finally:
+        workbook.close()
+
+
+def parse_requirements_ndjson(content):
+    """Rows of an uploaded NDJSON file, one requirement object per line."""
+    records = []
+    for i, line in enumerate(content.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {i} is not valid JSON")
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {i} is not a JSON object")
+        records.append(record)
+    # Objects carry their own keys; missing fields are caught per row
+    return _validated_rows(COLUMN_NAMES, records)
+
+
+def parse_requirements_parquet(data):
+    """Rows of an uploaded Parquet file, validated like a CSV."""
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    names = parquet.schema_arrow.names
+    records = (
+        record
+        for batch in parquet.iter_batches(columns=[name for name in COLUMN_NAMES if name in names])
+        for record in batch.to_pylist()
+    )
+    return _validated_rows(names, records)
+
+
+def parse_requirements_file(filename, data):
+    """Parse an upload by its extension: .csv (default), .xlsx, .ndjson/.jsonl or .parquet, optionally .gz."""
+    filename = (filename or "").lower()
+    if filename.endswith(".gz"):
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError):
+            raise ValueError("File is not valid gzip")
+        filename = filename[:-3]
+    if filename.endswith(".xlsx"):
+        return parse_requirements_xlsx(data)
+    if filename.endswith(".parquet"):
+        return parse_requirements_parquet(data)
+    try:
+        content = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("File is not valid UTF-8")
+    if filename.endswith((".ndjson", ".jsonl")):
+        return parse_requirements_ndjson(content)
+    return parse_requirements_csv(content)
+
+
+def etag(content):
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def _csv_template():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    writer.writerow([column.example for column in REQUIREMENT_COLUMNS])
+    return buffer.getvalue().encode()
+
+
+# Built once at import; it only changes with the code
+CSV_TEMPLATE = _csv_template()
+CSV_TEMPLATE_ETAG = etag(CSV_TEMPLATE)
+
+
+def xlsx_row(sheet, values):
+    """Cells for sheet.append() that keep strings as text.
+
+    openpyxl otherwise stores a string starting with "=" as a formula, which
+    would run in the user's spreadsheet and not read back as the value.
+    """
+    from openpyxl.cell import WriteOnlyCell
+
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(sheet, value)
+        if isinstance(value, str):
+            cell.data_type = "s"
+        cells.append(cell)
+    return cells
+
+
+def xlsx_template(categories, products):
+    """XLSX template whose category and product cells offer the given values.
+
+    The dropdowns only suggest: new categories, and several products in one
+    cell, are still accepted.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.datavalidation import DataValidation
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Requirements"
+    sheet.append(COLUMN_NAMES)
+    sheet.append(xlsx_row(sheet, [column.example for column in REQUIREMENT_COLUMNS]))
+    for i, column in enumerate(REQUIREMENT_COLUMNS, 1):
+        sheet.column_dimensions[get_column_letter(i)].width = 60 if column.name == "requirement" else 24
+
+    # List values live on a hidden sheet; inline lists are limited to 255 characters
+    lists = workbook.create_sheet("Lists")
+    lists.sheet_state = "hidden"
+    for name, values in (("category", categories), ("product", products)):
+        if not values:
+            continue
+        letter = get_column_letter(COLUMN_NAMES.index(name) + 1)
+        list_letter = "A" if name == "category" else "B"
+        for row, value in enumerate(values, 1):
+            cell = lists[f"{list_letter}{row}"]
+            cell.value = value
+            cell.data_type = "s"
+        validation = DataValidation(
+            type="list",
+            formula1=f"=Lists!${list_letter}$1:${list_letter}${len(values)}",
+            allow_blank=True,
+            showErrorMessage=False,
+        )
+        sheet.add_data_validation(validation)
+        validation.add(f"{letter}2:{letter}10000")
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
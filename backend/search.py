@@ -0,0 +1,117 @@
+import html
+import re
+from sqlalchemy import text
+
+SEARCH_CONFIG = "english"
+
+# Weighted document for the generated search_vector columns: a hit in the
+# requirement text ranks above one in the category, which ranks above product.
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(requirement, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(category, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(product, '')), 'C')"
+)
+
+# ts_headline copies the text as it is, so matches are delimited with
+# private-use characters and turned into <mark> only after escaping
+HEADLINE_START, HEADLINE_STOP = "\ue000", "\ue001"
+HEADLINE_OPTIONS = f'StartSel="{HEADLINE_START}", StopSel="{HEADLINE_STOP}", MaxWords=35, MinWords=15, MaxFragments=2'
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def prefix_tsquery(q):
+    """Turn partial input such as "sso integ" into "sso & integ:*" for typeahead.
+
+    Returns None when the input has no searchable tokens.
+    """
+    tokens = _TOKEN_RE.findall(q or "")
+    if not tokens:
+        return None
+    return " & ".join(tokens[:-1] + [f"{tokens[-1]}:*"])
+
+
+def snippet_html(headline):
+    """ts_headline output as HTML: the text escaped, matches wrapped in <mark>."""
+    if headline is None:
+        return None
+    return html.escape(headline).replace(HEADLINE_START, "<mark>").replace(HEADLINE_STOP, "</mark>")
+
+
+def _search(db, table, q, limit, offset, extra_where="", params=None, prefix=False):
+    if prefix:
+        query_sql = f"to_tsquery('{SEARCH_CONFIG}', :q)"
+        q = prefix_tsquery(q)
+        if q is None:
+            return []
+    else:
+        query_sql = f"websearch_to_tsquery('{SEARCH_CONFIG}', :q)"
+
+    # Rank and limit first, then build headlines for the returned page only,
+    # since ts_headline re-parses the full text of each row.
+    rows = db.execute(
+        text(f"""
+            SELECT hits.*,
+                   ts_headline('{SEARCH_CONFIG}', hits.requirement, query, :headline_options) AS snippet
+            FROM (
+                SELECT t.*, ts_rank_cd(t.search_vector, query) AS rank, query
+                FROM {table} t, {query_sql} AS query
+                WHERE t.search_vector @@ query {extra_where}
+                ORDER BY rank DESC, t.id
+                LIMIT :limit OFFSET :offset
+            ) AS hits
+            ORDER BY hits.rank DESC, hits.id
+        """),
+        {**(params or {}), "q": q, "limit": limit, "offset": offset, "headline_options": HEADLINE_OPTIONS},
+    ).mappings().all()
+    return rows
+
+
+def search_requirements(db, q, limit=20, offset=0, prefix=False):
+    rows = _search(db, "requirements", q, limit, offset, prefix=prefix)
+    return [
+        {
+            "id": row["id"],
+            "category": row["category"],
+            "requirement": row["requirement"],
+            "product": row["product"],
+            "rank": row["rank"],
+            "snippet": snippet_html(row["snippet"]),
+        }
+        for row in rows
+    ]
+
+
+# SCD rows with their shared texts; Postgres flattens this into a plain join
+SCD_REQUIREMENTS_SQL = """(
+    SELECT s.id, s.document_id, s.original_requirement_id, s."order",
+           x.category, x.requirement, x.product, x.search_vector
+    FROM scd_requirements s JOIN requirement_texts x ON x.hash = s.text_hash
+)"""
+
+
+def search_scd_requirements(db, document_id, q, limit=20, offset=0, prefix=False):
+    rows = _search(
+        db,
+        SCD_REQUIREMENTS_SQL,
+        q,
+        limit,
+        offset,
+        extra_where="AND t.document_id = :document_id",
+        params={"document_id": document_id},
+        prefix=prefix,
+    )
+    return [
+        {
+            "id": row["id"],
+            "document_id": row["document_id"],
+            "category": row["category"],
+            "requirement": row["requirement"],
+            "product": row["product"],
+            "original_requirement_id": row["original_requirement_id"],
+            "order": row["order"],
+            "rank": row["rank"],
+            "snippet": snippet_html(row["snippet"]),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,68 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from backend.db import SessionLocal, Setting
+from backend.invalidation import bus
+
+logger = logging.getLogger(__name__)
+
+# Known settings: name -> (type, default). Values in the table that do not
+# coerce to the declared type are ignored in favour of the default.
+SETTING_TYPES = {
+    "session_duration": (int, int(os.getenv("DEFAULT_SESSION_DURATION", "3600"))),  # 1 hour in seconds
+}
+
+
+class SettingsService:
+    """Cluster-wide settings stored in the settings table.
+
+    Reads are served from an in-process cache. Writes publish a "settings"
+    event on the invalidation bus, and every replica reloads the cache when
+    it arrives, so settings reads never query the database.
+    """
+
+    def __init__(self, types):
+        self.types = types
+        self._values = {}
+        self._lock = threading.Lock()
+        bus.subscribe("settings", lambda key: self.load())
+
+    def get(self, key):
+        kind, default = self.types[key]
+        with self._lock:
+            return self._values.get(key, default)
+
+    def load(self):
+        with SessionLocal() as db:
+            rows = db.execute(text("SELECT key, value FROM settings")).all()
+        values = {}
+        for key, value in rows:
+            if key not in self.types:
+                continue
+            kind, _ = self.types[key]
+            try:
+                values[key] = kind(value)
+            except (TypeError, ValueError):
+                logger.warning("Ignoring invalid value %r for setting %s", value, key)
+        with self._lock:
+            self._values = values
+
+    def set(self, db, key, value, user_email=None):
+        """Persist a setting and notify all replicas; the caller commits."""
+        kind, _ = self.types[key]
+        value = kind(value)
+        now = datetime.utcnow()
+        db.execute(
+            pg_insert(Setting)
+            .values(key=key, value=value, updated_at=now, updated_by=user_email)
+            .on_conflict_do_update(index_elements=[Setting.key], set_={"value": value, "updated_at": now, "updated_by": user_email})
+        )
+        # Delivered to every replica, including this one, on commit
+        bus.publish(db, "settings", key)
+        return value
+
+
+settings = SettingsService(SETTING_TYPES)
@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, text
+from backend.cache import cache
+from backend.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Serve dashboard aggregates from the requirement_stats materialized view
+# (created by db-manager) instead of scanning requirements on every request.
+USE_STATS_MATVIEW = os.getenv("REQUIREMENT_STATS_MATVIEW", "false").lower() == "true"
+FACETS_CACHE_TTL = int(os.getenv("FACETS_CACHE_TTL", "30"))
+# The view is refreshed in the background at most this often, so the
+# dashboard may trail writes by up to this many seconds
+STATS_REFRESH_INTERVAL = float(os.getenv("REQUIREMENT_STATS_REFRESH_INTERVAL", "10"))
+
+# The product column split into a trimmed text[]; must match the expression of
+# the ix_requirements_products GIN index for product filters to use it.
+PRODUCTS_ARRAY_SQL = "array_remove(regexp_split_to_array(btrim(COALESCE(r.product, '')), '\\s*[,;]\\s*'), '')"
+
+# One row per requirement and product, mirroring parseProducts() in the frontend:
+# the product column is a comma/semicolon separated list, blanks count as "N/A".
+# The grouping sets keep per-level distinct counts, so a requirement listed under
+# two products is still counted once in its category and in the overall total.
+# Levels: 0 = category x product, 1 = category, 2 = product, 3 = overall.
+REQUIREMENT_STATS_SQL = f"""
+    WITH expanded AS (
+        SELECT r.id,
+               r.category,
+               p.product,
+               CAST(COALESCE(r.updated_at, r.created_at) AS date) AS changed_on
+        FROM requirements r
+        CROSS JOIN LATERAL unnest(
+            COALESCE(
+                NULLIF({PRODUCTS_ARRAY_SQL}, '{{}}'),
+                ARRAY['N/A']
+            )
+        ) AS p(product)
+    )
+    SELECT GROUPING(category, product) AS level,
+           COALESCE(CASE WHEN GROUPING(category) = 0 THEN category END, '') AS category,
+           COALESCE(CASE WHEN GROUPING(product) = 0 THEN product END, '') AS product,
+           changed_on,
+           count(DISTINCT id) AS requirements
+    FROM expanded
+    GROUP BY GROUPING SETS (
+        (category, product, changed_on),
+        (category, changed_on),
+        (product, changed_on),
+        (changed_on)
+    )
+"""
+
+
+def requirement_stats(db, recent_days=7):
+    since = (datetime.utcnow() - timedelta(days=recent_days)).date()
+    return cache.get_or_load(
+        f"stats:requirements:{recent_days}:{since}",
+        lambda: _requirement_stats(db, recent_days, since),
+        # The view only changes when it is refreshed
+        tags=["requirement_stats" if USE_STATS_MATVIEW else "requirements"],
+        replica=db.info.get("read_only", False),
+    )
+
+
+def _requirement_stats(db, recent_days, since):
+    source = "requirement_stats" if USE_STATS_MATVIEW else f"({REQUIREMENT_STATS_SQL})"
+    rows = db.execute(
+        text(f"""
+            SELECT level, category, product,
+                   sum(requirements) AS total,
+                   COALESCE(sum(requirements) FILTER (WHERE changed_on >= :since), 0) AS recent
+            FROM {source} AS s
+            GROUP BY level, category, product
+            ORDER BY level, category, product
+        """),
+        {"since": since},
+    ).all()
+
+    result = {"total": 0, "recent": 0, "recent_days": recent_days, "categories": [], "products": [], "matrix": []}
+    for row in rows:
+        counts = {"total": int(row.total), "recent": int(row.recent)}
+        if row.level == 0:
+            result["matrix"].append({"category": row.category, "product": row.product, **counts})
+        elif row.level == 1:
+            result["categories"].append({"category": row.category, **counts})
+        elif row.level == 2:
+            result["products"].append({"product": row.product, **counts})
+        else:
+            result.update(counts)
+    return result
+
+
+def requirement_facets(db, categories=None, products=None, q=None, exclude_scd_id=None):
+    """Distinct categories and products with counts.
+
+    Each facet is restricted by every applied filter except its own, so the
+    dropdowns keep offering the alternatives to what is already selected.
+    """
+    key = json.dumps([sorted(categories or []), sorted(products or []), q or "", exclude_scd_id])
+    tags = ["requirements"] if exclude_scd_id is None else ["requirements", f"scd:{exclude_scd_id}"]
+    return cache.get_or_load(
+        f"facets:{key}",
+        lambda: _requirement_facets(db, categories, products, q, exclude_scd_id),
+        ttl=FACETS_CACHE_TTL,
+        tags=tags,
+        replica=db.info.get("read_only", False),
+    )
+
+
+def _requirement_facets(db, categories, products, q, exclude_scd_id):
+    params = {"categories": list(categories or []), "products": list(products or []), "q": f"%{q}%" if q else None, "scd_id": exclude_scd_id}
+    base = ["TRUE"]
+    if q:
+        base.append("r.requirement ILIKE :q")
+    if exclude_scd_id is not None:
+        base.append("""r.id NOT IN (
+            SELECT original_requirement_id FROM scd_requirements
+            WHERE document_id = :scd_id AND original_requirement_id IS NOT NULL
+        )""")
+    category_filter = "r.category = ANY(:categories)" if categories else "TRUE"
+    product_filter = f"{PRODUCTS_ARRAY_SQL} && CAST(:products AS text[])" if products else "TRUE"
+    where = " AND ".join(base)
+
+    category_rows = db.execute(
+        text(f"""
+            SELECT r.category AS value, count(*) AS count
+            FROM requirements r
+            WHERE {where} AND {product_filter}
+            GROUP BY r.category
+            ORDER BY r.category
+        """),
+        params,
+    ).all()
+    product_rows = db.execute(
+        text(f"""
+            SELECT p.product AS value, count(DISTINCT r.id) AS count
+            FROM requirements r
+            CROSS JOIN LATERAL unnest({PRODUCTS_ARRAY_SQL}) AS p(product)
+            WHERE {where} AND {category_filter}
+            GROUP BY p.product
+            ORDER BY p.product
+        """),
+        params,
+    ).all()
+
+    return {
+        "categories": [{"value": row.value, "count": row.count} for row in category_rows],
+        "products": [{"value": row.value, "count": row.count} for row in product_rows],
+    }
+
+
+def requirements_changed(db):
+    """Hook for every write to the requirements table; call it before db commits.
+
+    The invalidation is sent in the writer's transaction, so every replica
+    receives it exactly when the write becomes visible, or never if it rolls back.
+    """
+    cache.invalidate(db, "requirements")
+    if USE_STATS_MATVIEW:
+        event.listen(db, "after_commit", lambda session: stats_refresher.request(), once=True)
+
+
+def refresh_requirement_stats(db):
+    db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY requirement_stats"))
+    cache.invalidate(db, "requirement_stats")
+    db.commit()
+
+
+class StatsRefresher:
+    """Refreshes the requirement_stats view in a background thread.
+
+    The first request after an idle period refreshes at once; requests
+    arriving during a refresh or the `interval` after it are folded into
+    one more refresh, so a burst of writes costs two refreshes, not one per
+    write.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def request(self):
+        self._pending.set()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stats-refresh", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            db = SessionLocal()
+            try:
+                refresh_requirement_stats(db)
+            except Exception:
+                logger.exception("Refreshing requirement_stats failed; retrying in %ss", self.interval)
+                self._pending.set()
+            finally:
+                db.close()
+            time.sleep(self.interval)
+
+
+stats_refresher = StatsRefresher(STATS_REFRESH_INTERVAL)
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+
+import backend.cache as cache_module
+from backend.cache import Cache, MISSING, RedisBackend
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def backend():
+    return RedisBackend(fakeredis.FakeRedis(), prefix="test:")
+
+
+@pytest.fixture
+def cache(backend):
+    return Cache(backend, jitter=0)
+
+
+def test_set_get_with_tags(backend):
+    backend.set("a", {"at": datetime(2026, 10, 19, 12, 0)}, 60, tags=["requirements"])
+
+    assert backend.get("a") == {"at": "2026-10-19T12:00:00"}
+    assert backend.get("missing") is MISSING
+    assert backend.client.smembers("test:tag:requirements") == {b"a"}
+
+
+def test_delete_tags_drops_tagged_keys_and_bumps_versions(backend):
+    backend.set("a", 1, 60, tags=["requirements"])
+    backend.set("b", 2, 60, tags=["scd:1"])
+    before = backend.versions(["requirements", "scd:1"])
+
+    backend.delete_tags(["requirements"])
+
+    assert backend.get("a") is MISSING
+    assert backend.get("b") == 2
+    after = backend.versions(["requirements", "scd:1"])
+    assert after[0] != before[0]
+    assert after[1] == before[1]
+
+
+def test_delete_if_only_deletes_matching_value(backend):
+    assert backend.add("lock:a", 10, "mine")
+    assert not backend.add("lock:a", 10, "theirs")
+
+    backend.delete_if("lock:a", "theirs")
+    assert backend.client.get("test:lock:a") == b"mine"
+
+    backend.delete_if("lock:a", "mine")
+    assert backend.client.get("test:lock:a") is None
+
+
+def test_get_or_load_releases_its_own_lock(cache, backend):
+    assert cache.get_or_load("a", lambda: 1, tags=["requirements"]) == 1
+
+    assert backend.get("a") == 1
+    assert backend.client.get("test:lock:a") is None
+
+
+def test_get_or_load_keeps_another_replicas_lock(cache, backend, monkeypatch):
+    monkeypatch.setattr(cache_module, "LOAD_LOCK_TIMEOUT", 0.05)
+    backend.add("lock:a", 10, "other-replica")
+
+    # The other replica never stores a value, so this one loads after waiting
+    assert cache.get_or_load("a", lambda: 1) == 1
+
+    assert backend.client.get("test:lock:a") == b"other-replica"
+
+
+def test_get_or_load_skips_store_after_invalidation_during_load(cache, backend):
+    def loader():
+        # A writer invalidates the data while it is being read
+        backend.delete_tags(["requirements"])
+        return "old"
+
+    assert cache.get_or_load("a", loader, tags=["requirements"]) == "old"
+
+    assert backend.get("a") is MISSING
+    assert cache.get_or_load("a", lambda: "new", tags=["requirements"]) == "new"
+    assert backend.get("a") == "new"
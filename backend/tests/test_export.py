@@ -0,0 +1,22 @@
+from collections import namedtuple
+
+from backend.export import render_xlsx
+from backend.requirement_files import parse_requirements_file
+
+Row = namedtuple("Row", "category requirement product doc_link tenant_link")
+
+
+def test_xlsx_export_keeps_formula_like_text():
+    rows = [Row("=Security", "=Must support SSO for all users", "+Product A", None, "=HYPERLINK(\"http://x\")")]
+    data = b"".join(render_xlsx({"name": "SCD", "description": None}, rows))
+
+    parsed = parse_requirements_file("export.xlsx", data)
+
+    assert parsed == [{
+        "row_num": 1,
+        "category": "=Security",
+        "requirement": "=Must support SSO for all users",
+        "product": "+Product A",
+        "doc_link": None,
+        "tenant_link": "=HYPERLINK(\"http://x\")",
+    }]
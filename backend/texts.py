@@ -0,0 +1,38 @@
+import hashlib
+from sqlalchemy.dialects.postgresql import insert
+from backend.db import RequirementText
+
+TEXT_FIELDS = ("category", "requirement", "product", "doc_link", "tenant_link")
+
+# Same fingerprint in SQL, for migrations and set-based inserts. Fields are
+# joined with the unit separator and NULL is written as the record separator, so NULL
+# and '' hash differently.
+TEXT_HASH_SQL = (
+    "md5(" + " || chr(31) || ".join(f"coalesce({field}, chr(30))" for field in TEXT_FIELDS) + ")"
+)
+
+
+def text_hash(values):
+    """Hash of a requirement's text fields, given as a mapping."""
+    joined = "\x1f".join("\x1e" if values.get(field) is None else values[field] for field in TEXT_FIELDS)
+    return hashlib.md5(joined.encode()).hexdigest()
+
+
+def intern_texts(db, rows):
+    """Store each distinct text in `rows` once and return their hashes, in order.
+
+    Texts are immutable and shared by every SCD row with the same content, so
+    cloning a document only copies hashes; changing a row's text means
+    interning the new text and pointing the row at its hash.
+    """
+    values = [{field: row.get(field) for field in TEXT_FIELDS} for row in rows]
+    hashes = [text_hash(value) for value in values]
+    unique = dict(zip(hashes, values))
+    if unique:
+        # Sorted so concurrent inserts of overlapping texts take locks in the same order
+        db.execute(
+            insert(RequirementText)
+            .values([{"hash": h, **unique[h]} for h in sorted(unique)])
+            .on_conflict_do_nothing(index_elements=["hash"])
+        )
+    return hashes
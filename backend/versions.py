@@ -0,0 +1,326 @@
+import json
+import os
+from bisect import bisect_left
+from sqlalchemy import func, text
+from backend.db import RequirementText, SuccessCriteriaDocumentVersion as Version
+from backend.texts import TEXT_FIELDS
+
+# Every this many versions the full state is stored, so rebuilding any
+# version applies at most this many diffs
+SCD_CHECKPOINT_INTERVAL = int(os.getenv("SCD_CHECKPOINT_INTERVAL", "20"))
+
+# Snapshots and diffs hold requirement rows as [id, text_hash, original_requirement_id].
+# Texts are immutable rows of requirement_texts, so old versions can always be shown.
+ID, TEXT_HASH, ORIGINAL_ID = range(3)
+ROW_FIELDS = {"text_hash": TEXT_HASH, "original_requirement_id": ORIGINAL_ID}
+DOCUMENT_FIELDS = ("name", "description")
+
+
+def document_snapshot(db, document_id, lock=False):
+    """Current state of a document, or None if it does not exist.
+
+    With lock=True the document row stays locked until the transaction ends,
+    so concurrent saves of one document record their versions in turn.
+    """
+    doc = db.execute(
+        text(f"SELECT name, description FROM success_criteria_documents WHERE id = :id{' FOR UPDATE' if lock else ''}"),
+        {"id": document_id},
+    ).first()
+    if doc is None:
+        return None
+    rows = db.execute(
+        text('SELECT id, text_hash, original_requirement_id FROM scd_requirements WHERE document_id = :id ORDER BY "order", id'),
+        {"id": document_id},
+    ).all()
+    return {"name": doc.name, "description": doc.description, "requirements": [list(row) for row in rows]}
+
+
+def _longest_increasing(values):
+    """Indexes of one longest strictly increasing subsequence of `values`."""
+    tails, tail_values = [], []
+    previous = [None] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tail_values, value)
+        previous[i] = tails[k - 1] if k else None
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(value)
+        else:
+            tails[k] = i
+            tail_values[k] = value
+    result = set()
+    i = tails[-1] if tails else None
+    while i is not None:
+        result.add(i)
+        i = previous[i]
+    return result
+
+
+def diff_snapshots(old, new):
+    """The change from snapshot `old` to `new`; empty when they are equal.
+
+    fields:  {field: [old, new]} for changed document fields
+    removed: rows no longer present, as they were
+    added:   [[index, row]] for new rows, at their index in `new`
+    moved:   [[index, id]] for kept rows that changed position, the fewest
+             needed (everything outside a longest run already in order)
+    patched: [[id, {field: [old, new]}]] for kept rows with changed fields
+    """
+    diff = {}
+    fields = {field: [old[field], new[field]] for field in DOCUMENT_FIELDS if old[field] != new[field]}
+    old_rows = {row[ID]: row for row in old["requirements"]}
+    new_index = {row[ID]: i for i, row in enumerate(new["requirements"])}
+
+    removed = [row for row in old["requirements"] if row[ID] not in new_index]
+    added = []
+    patched = []
+    for i, row in enumerate(new["requirements"]):
+        before = old_rows.get(row[ID])
+        if before is None:
+            added.append([i, row])
+            continue
+        changes = {field: [before[k], row[k]] for field, k in ROW_FIELDS.items() if before[k] != row[k]}
+        if changes:
+            patched.append([row[ID], changes])
+
+    # New positions of the kept rows, in their old order
+    positions = [new_index[row[ID]] for row in old["requirements"] if row[ID] in new_index]
+    in_order = _longest_increasing(positions)
+    moved = [[p, new["requirements"][p][ID]] for i, p in enumerate(positions) if i not in in_order]
+
+    for key, value in (("fields", fields), ("removed", removed), ("added", added), ("moved", sorted(moved)), ("patched", patched)):
+        if value:
+            diff[key] = value
+    return diff
+
+
+def apply_diff(snapshot, diff):
+    """The snapshot that diff_snapshots(snapshot, new) was computed against turned into `new`."""
+    state = {field: snapshot[field] for field in DOCUMENT_FIELDS}
+    for field, (_, value) in diff.get("fields", {}).items():
+        state[field] = value
+
+    rows = {row[ID]: row for row in snapshot["requirements"]}
+    moved = diff.get("moved", [])
+    dropped = {row[ID] for row in diff.get("removed", [])} | {row_id for _, row_id in moved}
+    result = [row for row in snapshot["requirements"] if row[ID] not in dropped]
+    # In ascending target order, everything before each index is already in place
+    inserts = [(i, row) for i, row in diff.get("added", [])] + [(i, rows[row_id]) for i, row_id in moved]
+    for i, row in sorted(inserts, key=lambda insert: insert[0]):
+        result.insert(i, row)
+
+    patches = {row_id: changes for row_id, changes in diff.get("patched", [])}
+    if patches:
+        result = [_patch(row, patches[row[ID]]) if row[ID] in patches else row for row in result]
+    state["requirements"] = result
+    return state
+
+
+def _patch(row, changes):
+    row = list(row)
+    for field, (_, value) in changes.items():
+        row[ROW_FIELDS[field]] = value
+    return row
+
+
+def compose_diffs(diffs):
+    """The net change across consecutive diffs, without positions.
+
+    Takes time proportional to the diffs, not to the document. `moved` lists
+    rows repositioned by any of the diffs and still present at the end.
+    """
+    fields, added, removed, moved, patched = {}, {}, {}, set(), {}
+    for diff in diffs:
+        for field, (old, new) in diff.get("fields", {}).items():
+            fields[field] = [fields.get(field, [old])[0], new]
+        for row in diff.get("removed", []):
+            row_id = row[ID]
+            moved.discard(row_id)
+            changes = patched.pop(row_id, {})
+            if added.pop(row_id, None) is None:
+                # Report the row as it was before the first diff
+                removed[row_id] = _patch(row, {field: [None, old] for field, (old, _) in changes.items()})
+        for _, row in diff.get("added", []):
+            added[row[ID]] = list(row)
+        for _, row_id in diff.get("moved", []):
+            if row_id not in added:
+                moved.add(row_id)
+        for row_id, changes in diff.get("patched", []):
+            if row_id in added:
+                added[row_id] = _patch(added[row_id], changes)
+                continue
+            net = patched.setdefault(row_id, {})
+            for field, (old, new) in changes.items():
+                net[field] = [net.get(field, [old])[0], new]
+
+    return {
+        "fields": {field: change for field, change in fields.items() if change[0] != change[1]},
+        "removed": list(removed.values()),
+        "added": list(added.values()),
+        "moved": sorted(moved),
+        "patched": [
+            [row_id, net] for row_id, net in (
+                (row_id, {field: change for field, change in changes.items() if change[0] != change[1]})
+                for row_id, changes in patched.items()
+            ) if net
+        ],
+    }
+
+
+def invert_diff(net):
+    """compose_diffs() result for the opposite direction."""
+    return {
+        "fields": {field: [new, old] for field, (old, new) in net["fields"].items()},
+        "removed": net["added"],
+        "added": net["removed"],
+        "moved": net["moved"],
+        "patched": [[row_id, {field: [new, old] for field, (old, new) in changes.items()}] for row_id, changes in net["patched"]],
+    }
+
+
+def _size(value):
+    return len(json.dumps(value))
+
+
+def record_version(db, document_id, author, before=None):
+    """Store the document's current state as its next version; the caller commits db.
+
+    `before` is document_snapshot(db, document_id, lock=True) taken before
+    the change, or None for a new document. Nothing is stored when the
+    state did not change.
+    """
+    db.flush()
+    after = document_snapshot(db, document_id)
+    head = db.query(func.max(Version.version)).filter(Version.document_id == document_id).scalar()
+    if head is None and before is not None:
+        # Documents saved before versioning existed start from their previous state
+        db.add(Version(document_id=document_id, version=1, checkpoint=before))
+        head = 1
+
+    diff = None
+    if before is not None:
+        diff = diff_snapshots(before, after)
+        if not diff:
+            return None
+    version = (head or 0) + 1
+    # Also checkpoint when the diff is not much smaller than the state itself
+    checkpoint = diff is None or (version - 1) % SCD_CHECKPOINT_INTERVAL == 0 or 2 * _size(diff) > _size(after)
+    entry = Version(
+        document_id=document_id,
+        version=version,
+        created_by=author,
+        diff=diff,
+        checkpoint=after if checkpoint else None,
+    )
+    db.add(entry)
+    return entry
+
+
+def list_versions(db, document_id, limit=50, offset=0):
+    rows = db.execute(
+        text("""
+            SELECT version, created_at, created_by, checkpoint IS NOT NULL AS checkpoint,
+                   ARRAY(SELECT jsonb_object_keys(COALESCE(diff->'fields', '{}'))) AS fields,
+                   jsonb_array_length(COALESCE(diff->'added', '[]')) AS added,
+                   jsonb_array_length(COALESCE(diff->'removed', '[]')) AS removed,
+                   jsonb_array_length(COALESCE(diff->'moved', '[]')) AS moved,
+                   jsonb_array_length(COALESCE(diff->'patched', '[]')) AS patched
+            FROM scd_versions
+            WHERE document_id = :document_id
+            ORDER BY version DESC
+            LIMIT :limit OFFSET :offset
+        """),
+        {"document_id": document_id, "limit": limit, "offset": offset},
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def _texts(db, hashes):
+    hashes = set(hashes)
+    if not hashes:
+        return {}
+    return {text.hash: text for text in db.query(RequirementText).filter(RequirementText.hash.in_(hashes))}
+
+
+def _requirement(document_id, row, texts, order=None):
+    text = texts[row[TEXT_HASH]]
+    return {
+        "id": row[ID],
+        "document_id": document_id,
+        **{field: getattr(text, field) for field in TEXT_FIELDS},
+        "original_requirement_id": row[ORIGINAL_ID],
+        "order": order,
+    }
+
+
+def get_version(db, document_id, version):
+    """A version of the document with its requirements, or None.
+
+    Rebuilt from the latest checkpoint at or before `version` plus the
+    diffs after it.
+    """
+    latest_checkpoint = db.query(func.max(Version.version)).filter(
+        Version.document_id == document_id,
+        Version.version <= version,
+        Version.checkpoint.isnot(None),
+    ).scalar_subquery()
+    rows = db.query(Version).filter(
+        Version.document_id == document_id,
+        Version.version >= latest_checkpoint,
+        Version.version <= version,
+    ).order_by(Version.version).all()
+    if not rows or rows[-1].version != version:
+        return None
+
+    state = rows[0].checkpoint
+    for row in rows[1:]:
+        state = apply_diff(state, row.diff)
+    texts = _texts(db, (row[TEXT_HASH] for row in state["requirements"]))
+    return {
+        "id": document_id,
+        "version": version,
+        "created_at": rows[-1].created_at,
+        "created_by": rows[-1].created_by,
+        "name": state["name"],
+        "description": state["description"],
+        "requirements": [_requirement(document_id, row, texts, i) for i, row in enumerate(state["requirements"])],
+    }
+
+
+def version_diff(db, document_id, from_version, to_version):
+    """What changed between two versions, in either direction, or None if one does not exist."""
+    low, high = sorted((from_version, to_version))
+    rows = db.query(Version.version, Version.diff).filter(
+        Version.document_id == document_id,
+        Version.version >= low,
+        Version.version <= high,
+    ).order_by(Version.version).all()
+    if len(rows) != high - low + 1:
+        return None
+
+    net = compose_diffs(row.diff for row in rows[1:])
+    if from_version > to_version:
+        net = invert_diff(net)
+
+    texts = _texts(db, [row[TEXT_HASH] for row in net["added"] + net["removed"]] + [
+        value for _, changes in net["patched"] for value in changes.get("text_hash", ())
+    ])
+    patched = []
+    for row_id, changes in net["patched"]:
+        fields = {}
+        if "text_hash" in changes:
+            old, new = (texts[h] for h in changes["text_hash"])
+            fields = {field: [getattr(old, field), getattr(new, field)] for field in TEXT_FIELDS if getattr(old, field) != getattr(new, field)}
+        if "original_requirement_id" in changes:
+            fields["original_requirement_id"] = changes["original_requirement_id"]
+        patched.append({"id": row_id, "changes": fields})
+    return {
+        "id": document_id,
+        "from": from_version,
+        "to": to_version,
+        "fields": net["fields"],
+        "added": [_requirement(document_id, row, texts) for row in net["added"]],
+        "removed": [_requirement(document_id, row, texts) for row in net["removed"]],
+        "moved": net["moved"],
+        "patched": patched,
+    }
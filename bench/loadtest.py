@@ -0,0 +1,332 @@
+"""
+HTTP load test for the backend API.
+
+Starts the FastAPI app in-process with uvicorn against DATABASE_URL (use a
+local Postgres, ideally filled with db-manager/generate_data.py), replaces
+Google ID token verification with a local stand-in, and drives each scenario
+with concurrent clients. Reports p50/p95/p99 latency, throughput and database
+queries per request, and compares them with a saved baseline.
+
+    python bench/loadtest.py --save-baseline            # record bench/baseline.json
+    python bench/loadtest.py                            # compare against it
+    python bench/loadtest.py --scenarios list_requirements,search --concurrency 16
+
+Exits with status 1 when a scenario regresses beyond --tolerance.
+"""
+import argparse
+import contextvars
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import uvicorn
+from sqlalchemy import event
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Measure the API itself; a few bench principals would otherwise be rate limited
+os.environ.setdefault("ADMISSION_CONTROL", "false")
+import backend.main as api
+from backend.db import SessionLocal, User as DBUser, engine, replica_engine
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+TOKEN_PREFIX = "bench:"
+
+# --- Local stand-ins ---------------------------------------------------------
+
+def fake_verify_oauth2_token(token, request, audience=None):
+    """Accepts "bench:<email>" instead of a Google-signed ID token."""
+    if not token.startswith(TOKEN_PREFIX):
+        raise ValueError("Not a bench token")
+    email = token[len(TOKEN_PREFIX):]
+    return {"email": email, "name": email.split("@")[0], "picture": None}
+
+
+api.id_token.verify_oauth2_token = fake_verify_oauth2_token
+
+# --- Per-request query counting ----------------------------------------------
+
+_query_counter = contextvars.ContextVar("query_counter", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+# Read-only handlers may be routed to the replica when one is configured
+ENGINES = [engine] + ([replica_engine] if replica_engine is not None else [])
+for _engine in ENGINES:
+    event.listen(_engine, "before_cursor_execute", _count_query)
+
+
+@api.app.middleware("http")
+async def _query_count_header(request, call_next):
+    # Sync endpoints run in a worker thread with a copy of this context, so
+    # they share the same counter list
+    counter = [0]
+    _query_counter.set(counter)
+    response = await call_next(request)
+    response.headers["X-DB-Queries"] = str(counter[0])
+    return response
+
+# --- Scenarios ---------------------------------------------------------------
+
+class Client:
+    def __init__(self, base_url, email):
+        self.base_url = base_url
+        self.email = email
+        self.session = requests.Session()
+        self.token = None
+
+    def request(self, method, path, **kw):
+        headers = kw.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        response = self.session.request(method, self.base_url + path, headers=headers, timeout=60, **kw)
+        response.raise_for_status()
+        return response
+
+    def login(self):
+        response = self.request("POST", "/api/login", json={"id_token": TOKEN_PREFIX + self.email})
+        self.token = response.json()["token"]
+        return response
+
+
+def scenario_login(client, state):
+    return client.login()
+
+
+def scenario_list_requirements(client, state):
+    return client.request("GET", "/api/requirements")
+
+
+def scenario_search(client, state):
+    return client.request("GET", "/api/requirements/search", params={"q": "integrates cloud"})
+
+
+def scenario_typeahead(client, state):
+    return client.request("GET", "/api/requirements/search", params={"q": "vuln", "prefix": "true"})
+
+
+def scenario_facets(client, state):
+    return client.request("GET", "/api/requirements/facets", params={"product": "Cloud"})
+
+
+def scenario_stats(client, state):
+    return client.request("GET", "/api/stats/requirements")
+
+
+def scenario_bulk_upload(client, state):
+    batch = uuid.uuid4().hex
+    lines = ["category,requirement,product,doc_link,tenant_link"]
+    lines += [f"Bench,Benchmark requirement {batch} {i},Cloud,," for i in range(20)]
+    return client.request(
+        "POST", "/api/requirements/bulk-upload",
+        files={"file": ("bench.csv", "\n".join(lines), "text/csv")},
+    )
+
+
+def scenario_scd_create(client, state):
+    return client.request("POST", "/api/scd", json={"name": f"Bench {uuid.uuid4().hex[:8]}", "requirements": []})
+
+
+def scenario_scd_get(client, state):
+    return client.request("GET", f"/api/scd/{state['scd_ids'][client.email]}")
+
+
+def scenario_scd_clone(client, state):
+    return client.request("POST", f"/api/scd/{state['scd_ids'][client.email]}/clone")
+
+
+def scenario_scd_add(client, state):
+    scd = client.request("POST", "/api/scd", json={"name": "Bench add", "requirements": []}).json()
+    return client.request("PUT", f"/api/scd/{scd['id']}/requirements", json={"requirement_ids": state["requirement_ids"]})
+
+
+def scenario_audit_logs(client, state):
+    return client.request("GET", "/api/audit-logs", params={"limit": 100, "action": "login"})
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "list_requirements": scenario_list_requirements,
+    "search": scenario_search,
+    "typeahead": scenario_typeahead,
+    "facets": scenario_facets,
+    "stats": scenario_stats,
+    "bulk_upload": scenario_bulk_upload,
+    "scd_create": scenario_scd_create,
+    "scd_get": scenario_scd_get,
+    "scd_clone": scenario_scd_clone,
+    "scd_add": scenario_scd_add,
+    "audit_logs": scenario_audit_logs,
+}
+
+# --- Runner ------------------------------------------------------------------
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_scenario(fn, clients, state, duration, warmup):
+    latencies = []
+    queries = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(client):
+        nonlocal errors
+        warm_until = time.monotonic() + warmup
+        stop_at = warm_until + duration
+        backoff = 0
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            started = time.perf_counter()
+            try:
+                response = fn(client, state)
+            except requests.RequestException:
+                with lock:
+                    errors += 1
+                # Back off instead of hammering a failing server
+                backoff = min(backoff * 2 or 0.05, 1.0)
+                time.sleep(min(backoff, max(0, stop_at - time.monotonic())))
+                continue
+            backoff = 0
+            elapsed = time.perf_counter() - started
+            if now >= warm_until:
+                with lock:
+                    latencies.append(elapsed * 1000)
+                    queries.append(int(response.headers.get("X-DB-Queries", 0)))
+
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        list(pool.map(worker, clients))
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries_per_request": round(statistics.mean(queries), 2) if queries else 0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if base[metric] and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {result[metric]} > baseline {base[metric]}")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput_rps']} < baseline {base['throughput_rps']}")
+        if result["queries_per_request"] > base["queries_per_request"]:
+            regressions.append(f"{name}: queries/request {result['queries_per_request']} > baseline {base['queries_per_request']}")
+    return regressions
+
+
+def start_server(port):
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def prepare(base_url, concurrency):
+    clients = [Client(base_url, f"bench{i}@example.com") for i in range(concurrency)]
+    for client in clients:
+        client.login()
+
+    # Audit log browsing is admin only
+    with SessionLocal() as db:
+        db.query(DBUser).filter(DBUser.email.in_([c.email for c in clients])).update({"role": "admin"}, synchronize_session=False)
+        db.commit()
+    api.user_cache.clear()
+    for client in clients:
+        client.login()
+
+    requirements_page = clients[0].request("GET", "/api/requirements/search", params={"q": "cloud"}).json()
+    state = {
+        "requirement_ids": [r["id"] for r in requirements_page[:10]],
+        "scd_ids": {},
+    }
+    for client in clients:
+        scd = client.request("POST", "/api/scd", json={"name": "Bench fixture", "requirements": []}).json()
+        if state["requirement_ids"]:
+            client.request("PUT", f"/api/scd/{scd['id']}/requirements", json={"requirement_ids": state["requirement_ids"]})
+        state["scd_ids"][client.email] = scd["id"]
+    return clients, state
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds per scenario")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    server, thread = start_server(args.port)
+    try:
+        clients, state = prepare(f"http://127.0.0.1:{args.port}", args.concurrency)
+        results = {}
+        for name in names:
+            results[name] = run_scenario(SCENARIOS[name], clients, state, args.duration, args.warmup)
+            r = results[name]
+            print(f"{name:20} {r['requests']:7} req {r['throughput_rps']:8} rps  "
+                  f"p50 {r['p50_ms']:8} ms  p95 {r['p95_ms']:8} ms  p99 {r['p99_ms']:8} ms  "
+                  f"{r['queries_per_request']:5} q/req  {r['errors']} errors")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,177 @@
+"""
+Query-plan regression checks for the hot SQL statements.
+
+Calls the main endpoints in-process (see loadtest.py) and records every SQL
+statement they send. Each statement is then re-run as EXPLAIN (FORMAT JSON)
+with the same parameters. A check fails when
+  - a plan contains a Seq Scan on a table with more than --min-rows rows
+    (unless that endpoint is allowed to scan that table), or
+  - a statement's estimated total cost grows past --cost-factor times the
+    cost recorded in the plan baseline.
+
+Run against the synthetic-scale dataset from db-manager/generate_data.py:
+
+    python bench/query_plans.py --save-baseline     # record bench/plan_baseline.json
+    python bench/query_plans.py                     # check, exit 1 on failures
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+
+from sqlalchemy import event
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from loadtest import ENGINES, prepare, start_server
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "plan_baseline.json")
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE|INSERT\s+INTO\s+\S+\s*(\([^)]*\))?\s*SELECT)\b", re.IGNORECASE | re.DOTALL)
+SKIPPED = re.compile(r"^\s*SELECT\s+(1|set_config)\b", re.IGNORECASE)
+
+# Endpoints that return a whole table by design
+ALLOWED_SEQ_SCANS = {
+    "list_requirements": {"requirements"},
+}
+
+_captured = None
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if _captured is not None and not executemany:
+        # Explained later on the engine that ran it, primary or replica
+        _captured.append((statement, parameters, conn.engine))
+
+
+for _engine in ENGINES:
+    event.listen(_engine, "before_cursor_execute", _capture)
+
+
+def capture(fn):
+    global _captured
+    _captured = []
+    try:
+        fn()
+        return _captured
+    finally:
+        _captured = None
+
+
+def endpoint_calls(client, state):
+    scd_id = state["scd_ids"][client.email]
+    calls = [
+        ("list_requirements", lambda: client.request("GET", "/api/requirements")),
+        ("list_scds", lambda: client.request("GET", "/api/scd")),
+        ("list_shared_scds", lambda: client.request("GET", "/api/scd/shared")),
+        ("get_scd", lambda: client.request("GET", f"/api/scd/{scd_id}")),
+        ("add_requirements_to_scd", lambda: client.request(
+            "PUT", f"/api/scd/{scd_id}/requirements", json={"requirement_ids": state["requirement_ids"][:1]})),
+    ]
+    filters = {"start_date": "2024-01-01", "end_date": "2030-01-01", "email": "user1", "action": "login"}
+    for size in range(len(filters) + 1):
+        for combo in itertools.combinations(sorted(filters), size):
+            params = {key: filters[key] for key in combo}
+            name = "get_audit_logs" + "".join(f"[{key}]" for key in combo)
+            calls.append((name, lambda params=params: client.request("GET", "/api/audit-logs", params=params)))
+    return calls
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+def explain(connection, statement, parameters):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        return cursor.fetchone()[0][0]["Plan"]
+    finally:
+        cursor.close()
+
+
+def table_sizes(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'm')")
+    sizes = dict(cursor.fetchall())
+    cursor.close()
+    return sizes
+
+
+def check(min_rows, cost_factor, baseline):
+    server, thread = start_server(8766)
+    try:
+        clients, state = prepare("http://127.0.0.1:8766", 1)
+        calls = endpoint_calls(clients[0], state)
+        captured = [(name, capture(fn)) for name, fn in calls]
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    failures = []
+    results = {}
+    connections = {}
+    try:
+        for name, statements in captured:
+            explainable = [(s, p, e) for s, p, e in statements if EXPLAINABLE.match(s) and not SKIPPED.match(s)]
+            for i, (statement, parameters, statement_engine) in enumerate(explainable):
+                key = f"{name}#{i}"
+                if statement_engine not in connections:
+                    connection = statement_engine.raw_connection()
+                    connections[statement_engine] = (connection, table_sizes(connection))
+                connection, sizes = connections[statement_engine]
+                try:
+                    plan = explain(connection, statement, parameters)
+                except Exception as e:
+                    connection.rollback()
+                    failures.append(f"{key}: EXPLAIN failed: {e}")
+                    continue
+                connection.rollback()
+                cost = plan["Total Cost"]
+                results[key] = {"statement": " ".join(statement.split())[:300], "total_cost": cost}
+
+                for node in walk(plan):
+                    relation = node.get("Relation Name")
+                    if node["Node Type"] != "Seq Scan" or relation in ALLOWED_SEQ_SCANS.get(name, ()):
+                        continue
+                    if sizes.get(relation, 0) > min_rows:
+                        failures.append(f"{key}: Seq Scan on {relation} (~{int(sizes[relation])} rows) in {results[key]['statement']}")
+
+                base = baseline.get(key)
+                if base and cost > base["total_cost"] * cost_factor:
+                    failures.append(f"{key}: estimated cost {cost:.0f} > {cost_factor}x baseline {base['total_cost']:.0f}")
+    finally:
+        for connection, _ in connections.values():
+            connection.close()
+    return results, failures
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-rows", type=int, default=10000, help="ignore seq scans on tables smaller than this")
+    parser.add_argument("--cost-factor", type=float, default=2.0, help="allowed growth in estimated cost")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results, failures = check(args.min_rows, args.cost_factor, baseline)
+    for key, result in results.items():
+        print(f"{key:50} cost {result['total_cost']:12.1f}")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved plan baseline to {args.baseline}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
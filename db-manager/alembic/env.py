@@ -7,8 +7,11 @@ from alembic import context
 
 import os
 import sys
+import time
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from backend.db import Base, User
+from sqlalchemy.exc import OperationalError
+from online_migrations import set_timeouts, is_lock_timeout, LOCK_RETRIES, LOCK_RETRY_DELAY
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -73,13 +76,28 @@ def run_migrations_online() -> None:
         poolclass=pool.NullPool,
     )
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+    # Each revision commits on its own, so a lock timeout only rolls back the
+    # revision that hit it and the retry resumes from there.
+    for attempt in range(1, LOCK_RETRIES + 1):
+        try:
+            with connectable.connect() as connection:
+                set_timeouts(connection)
+                connection.commit()
+                context.configure(
+                    connection=connection,
+                    target_metadata=target_metadata,
+                    transaction_per_migration=True,
+                )
+
+                with context.begin_transaction():
+                    context.run_migrations()
+            return
+        except OperationalError as e:
+            if not is_lock_timeout(e) or attempt == LOCK_RETRIES:
+                raise
+            wait = LOCK_RETRY_DELAY * 2 ** (attempt - 1)
+            print(f"Migration hit lock_timeout (attempt {attempt}/{LOCK_RETRIES}), retrying in {wait:.1f}s", file=sys.stderr)
+            time.sleep(wait)
 
 
 if context.is_offline_mode():
@@ -0,0 +1,75 @@
+"""add structured details_json to audit_logs, backfilled from the text details
+
+Revision ID: 20261019_add_audit_log_details_json
+Revises: 20261019_create_scd_acl_table
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from online_migrations import create_index_concurrently, drop_index_concurrently, backfill
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_audit_log_details_json'
+down_revision = '20261019_create_scd_acl_table'
+branch_labels = None
+depends_on = None
+
+
+def matches(pattern, cast='integer'):
+    """Every first capture group of `pattern` in details, as a JSON array."""
+    return f"to_jsonb(ARRAY(SELECT CAST(m[1] AS {cast}) FROM regexp_matches(details, '{pattern}', 'g') AS m))"
+
+
+def id_list(pattern):
+    """A Python list repr such as [1, 2, 3] captured by `pattern`, as a JSON array."""
+    return f"COALESCE(to_jsonb(CAST(string_to_array(NULLIF(substring(details from '{pattern}'), ''), ', ') AS integer[])), '[]')"
+
+
+REQUIREMENT_ID = matches(r'^\w+ requirement id=(\d+)')
+DELETED_IDS = id_list(r'ids=\[(.*)\]')
+EDITED_IDS = id_list(r'on IDs: \[(.*)\]$')
+EDITED_FIELDS = matches(r"[{ ]''(\w+)'': ", 'text')
+SCD_IDS = matches(r'\(ID: (\d+)\)')
+PROMOTED_EMAIL = matches(r'^Changed (\S+) from', 'text')
+
+# Recovers entity and ids from the messages written by earlier releases.
+# Old id lists stay as plain arrays; backend/audit.py queries both forms.
+DETAILS_JSON_SQL = f"""
+    CASE
+        WHEN action IN ('add_requirement', 'edit_requirement', 'delete_requirement') THEN
+            jsonb_build_object('entity', 'requirement', 'ids', {REQUIREMENT_ID})
+        WHEN action = 'mass_delete_requirements' THEN
+            jsonb_build_object('entity', 'requirement', 'ids', {DELETED_IDS})
+        WHEN action = 'mass_edit_requirements' THEN
+            jsonb_build_object('entity', 'requirement', 'ids', {EDITED_IDS}, 'fields', {EDITED_FIELDS})
+        WHEN action IN ('create_scd', 'clone_scd') THEN
+            jsonb_build_object('entity', 'scd', 'ids', {SCD_IDS})
+        WHEN action = 'promote_user' THEN
+            jsonb_build_object('entity', 'user', 'ids', {PROMOTED_EMAIL}, 'fields', '["role"]'::jsonb)
+        WHEN action = 'login' THEN
+            jsonb_build_object('entity', 'user', 'ids', jsonb_build_array(user_email))
+        ELSE '{{}}'::jsonb
+    END
+"""
+
+
+def upgrade():
+    op.add_column('audit_logs', sa.Column('details_json', postgresql.JSONB(), nullable=True))
+    backfill('audit_logs', f"details_json = {DETAILS_JSON_SQL}", "details_json IS NULL")
+    create_index_concurrently(
+        'ix_audit_logs_details_json', 'audit_logs', ['details_json'],
+        postgresql_using='gin', postgresql_ops={'details_json': 'jsonb_path_ops'},
+    )
+    create_index_concurrently(
+        'ix_audit_logs_id_ranges', 'audit_logs', [sa.text("(details_json->>'entity')")],
+        postgresql_where=sa.text("details_json ? 'id_ranges'"),
+    )
+
+
+def downgrade():
+    drop_index_concurrently('ix_audit_logs_id_ranges', 'audit_logs')
+    drop_index_concurrently('ix_audit_logs_details_json', 'audit_logs')
+    op.drop_column('audit_logs', 'details_json')
@@ -0,0 +1,36 @@
+"""add audit log indexes for timestamp ordering and substring filters
+
+Revision ID: 20261019_add_audit_log_indexes
+Revises: 20261019_add_scd_foreign_key_indexes
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from online_migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_audit_log_indexes'
+down_revision = '20261019_add_scd_foreign_key_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # get_audit_logs orders by timestamp and filters with ILIKE '%...%'
+    create_index_concurrently('ix_audit_logs_timestamp', 'audit_logs', ['timestamp'])
+    create_index_concurrently(
+        'ix_audit_logs_user_email_trgm', 'audit_logs', ['user_email'],
+        postgresql_using='gin', postgresql_ops={'user_email': 'gin_trgm_ops'},
+    )
+    create_index_concurrently(
+        'ix_audit_logs_action_trgm', 'audit_logs', ['action'],
+        postgresql_using='gin', postgresql_ops={'action': 'gin_trgm_ops'},
+    )
+
+
+def downgrade():
+    drop_index_concurrently('ix_audit_logs_action_trgm', 'audit_logs')
+    drop_index_concurrently('ix_audit_logs_user_email_trgm', 'audit_logs')
+    drop_index_concurrently('ix_audit_logs_timestamp', 'audit_logs')
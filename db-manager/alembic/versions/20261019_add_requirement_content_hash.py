@@ -0,0 +1,69 @@
+"""add requirement content hash and trigram index for deduplication
+
+Revision ID: 20261019_add_requirement_content_hash
+Revises: 20261019_add_requirement_search_vectors
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+import sys
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_requirement_content_hash'
+down_revision = '20261019_add_requirement_search_vectors'
+branch_labels = None
+depends_on = None
+
+
+def _normalize(column):
+    return f"lower(regexp_replace(btrim(coalesce({column}, '')), '\\s+', ' ', 'g'))"
+
+
+CONTENT_HASH_SQL = (
+    f"md5({_normalize('category')} || chr(31) || {_normalize('requirement')} || chr(31) || "
+    f"regexp_replace({_normalize('product')}, ' ?[,;] ?', ',', 'g'))"
+)
+
+
+# Existing copies of a requirement, oldest first
+DUPLICATES_SQL = """
+    SELECT content_hash, array_agg(id ORDER BY id) AS ids
+    FROM requirements
+    GROUP BY content_hash
+    HAVING count(*) > 1
+    ORDER BY min(id)
+"""
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('requirements', sa.Column('content_hash', sa.Text(), sa.Computed(CONTENT_HASH_SQL, persisted=True)))
+    op.add_column('requirements', sa.Column('allow_duplicate', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    # Existing duplicates are kept and reported, not deleted: every copy but the
+    # oldest is marked allow_duplicate so the unique index skips it
+    duplicates = op.get_bind().execute(sa.text(DUPLICATES_SQL)).all()
+    if duplicates:
+        copies = sum(len(ids) - 1 for _, ids in duplicates)
+        print(f"Found {len(duplicates)} duplicated requirements ({copies} extra copies), marked allow_duplicate:", file=sys.stderr)
+        for _, ids in duplicates:
+            print(f"  kept id={ids[0]}, duplicates ids={', '.join(map(str, ids[1:]))}", file=sys.stderr)
+        op.get_bind().execute(
+            sa.text("UPDATE requirements SET allow_duplicate = true WHERE id = ANY(:ids)"),
+            {"ids": [i for _, ids in duplicates for i in ids[1:]]},
+        )
+
+    op.create_index(
+        'ix_requirements_content_hash', 'requirements', ['content_hash'],
+        unique=True, postgresql_where=sa.text('NOT allow_duplicate'),
+    )
+    op.execute("CREATE INDEX ix_requirements_requirement_trgm ON requirements USING gin (requirement gin_trgm_ops)")
+
+
+def downgrade():
+    op.execute("DROP INDEX ix_requirements_requirement_trgm")
+    op.drop_index('ix_requirements_content_hash', table_name='requirements')
+    op.drop_column('requirements', 'allow_duplicate')
+    op.drop_column('requirements', 'content_hash')
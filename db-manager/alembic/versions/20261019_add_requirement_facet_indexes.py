@@ -0,0 +1,31 @@
+"""add requirement facet indexes
+
+Revision ID: 20261019_add_requirement_facet_indexes
+Revises: 20261019_create_requirement_stats_view
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_requirement_facet_indexes'
+down_revision = '20261019_create_requirement_stats_view'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_requirements_category', 'requirements', ['category'], unique=False)
+    # Same expression as PRODUCTS_ARRAY_SQL in backend/stats.py, so that
+    # "product && ARRAY[...]" filters can use the index.
+    op.execute("""
+        CREATE INDEX ix_requirements_products ON requirements
+        USING gin (array_remove(regexp_split_to_array(btrim(COALESCE(product, '')), '\\s*[,;]\\s*'), ''))
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX ix_requirements_products")
+    op.drop_index('ix_requirements_category', table_name='requirements')
@@ -0,0 +1,39 @@
+"""add full-text search vectors to requirements and scd_requirements
+
+Revision ID: 20261019_add_requirement_search_vectors
+Revises: 20261019_add_requirement_facet_indexes
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_requirement_search_vectors'
+down_revision = '20261019_add_requirement_facet_indexes'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(requirement, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(product, '')), 'C')"
+)
+
+
+def upgrade():
+    for table in ('requirements', 'scd_requirements'):
+        op.add_column(table, sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR_SQL, persisted=True),
+        ))
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('requirements', 'scd_requirements'):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
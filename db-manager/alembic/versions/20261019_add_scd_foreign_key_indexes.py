@@ -0,0 +1,33 @@
+"""add foreign key indexes to scd tables and drop indexes duplicating primary keys
+
+Revision ID: 20261019_add_scd_foreign_key_indexes
+Revises: 20261019_add_requirement_content_hash
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from online_migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_scd_foreign_key_indexes'
+down_revision = '20261019_add_requirement_content_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index_concurrently('ix_scd_requirements_document_id_order', 'scd_requirements', ['document_id', 'order'])
+    create_index_concurrently('ix_success_criteria_documents_owner_id_updated_at', 'success_criteria_documents', ['owner_id', 'updated_at'])
+    drop_index_concurrently('ix_scd_requirements_id', 'scd_requirements')
+    drop_index_concurrently('ix_success_criteria_documents_id', 'success_criteria_documents')
+    drop_index_concurrently('ix_users_id', 'users')
+
+
+def downgrade():
+    create_index_concurrently('ix_users_id', 'users', ['id'])
+    create_index_concurrently('ix_scd_requirements_id', 'scd_requirements', ['id'])
+    create_index_concurrently('ix_success_criteria_documents_id', 'success_criteria_documents', ['id'])
+    drop_index_concurrently('ix_success_criteria_documents_owner_id_updated_at', 'success_criteria_documents')
+    drop_index_concurrently('ix_scd_requirements_document_id_order', 'scd_requirements')
@@ -0,0 +1,59 @@
+"""create requirement_stats materialized view
+
+Revision ID: 20261019_create_requirement_stats_view
+Revises: 20240722_create_scd_tables
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_create_requirement_stats_view'
+down_revision = '20240722_create_scd_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE MATERIALIZED VIEW requirement_stats AS
+        WITH expanded AS (
+            SELECT r.id,
+                   r.category,
+                   p.product,
+                   CAST(COALESCE(r.updated_at, r.created_at) AS date) AS changed_on
+            FROM requirements r
+            CROSS JOIN LATERAL unnest(
+                COALESCE(
+                    NULLIF(array_remove(regexp_split_to_array(btrim(COALESCE(r.product, '')), '\\s*[,;]\\s*'), ''), '{}'),
+                    ARRAY['N/A']
+                )
+            ) AS p(product)
+        )
+        SELECT GROUPING(category, product) AS level,
+               COALESCE(CASE WHEN GROUPING(category) = 0 THEN category END, '') AS category,
+               COALESCE(CASE WHEN GROUPING(product) = 0 THEN product END, '') AS product,
+               changed_on,
+               count(DISTINCT id) AS requirements
+        FROM expanded
+        GROUP BY GROUPING SETS (
+            (category, product, changed_on),
+            (category, changed_on),
+            (product, changed_on),
+            (changed_on)
+        )
+    """)
+    # REFRESH ... CONCURRENTLY needs a unique index covering every row
+    op.create_index(
+        'ix_requirement_stats_key',
+        'requirement_stats',
+        ['level', 'category', 'product', 'changed_on'],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_requirement_stats_key', table_name='requirement_stats')
+    op.execute("DROP MATERIALIZED VIEW requirement_stats")
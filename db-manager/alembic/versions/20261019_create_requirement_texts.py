@@ -0,0 +1,114 @@
+"""store scd requirement texts once in requirement_texts, keyed by hash (expand)
+
+The old text columns of scd_requirements stay, kept in sync by a trigger, until
+20261019_drop_scd_requirement_text_columns.
+
+Revision ID: 20261019_create_requirement_texts
+Revises: 20261019_create_settings_table
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from online_migrations import create_index_concurrently, drop_index_concurrently, backfill
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_create_requirement_texts'
+down_revision = '20261019_create_settings_table'
+branch_labels = None
+depends_on = None
+
+TEXT_COLUMNS = 'category, requirement, product, doc_link, tenant_link'
+
+TEXT_HASH_SQL = (
+    "md5(coalesce(category, chr(30)) || chr(31) || coalesce(requirement, chr(30)) || chr(31) || "
+    "coalesce(product, chr(30)) || chr(31) || coalesce(doc_link, chr(30)) || chr(31) || "
+    "coalesce(tenant_link, chr(30)))"
+)
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(requirement, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(product, '')), 'C')"
+)
+
+INSERT_TEXTS_SQL = f"""
+    INSERT INTO requirement_texts (hash, {TEXT_COLUMNS})
+    SELECT DISTINCT ON (text_hash) text_hash, {TEXT_COLUMNS}
+    FROM scd_requirements
+    WHERE text_hash IS NOT NULL
+    ON CONFLICT (hash) DO NOTHING
+"""
+
+# Until 20261019_drop_scd_requirement_text_columns, the previous release keeps
+# reading and writing the text columns while the new one uses text_hash. This
+# trigger keeps both in step: rows written with text columns get their hash
+# (and text interned), rows written with a new text_hash get their columns.
+SYNC_FUNCTION_SQL = f"""
+    CREATE FUNCTION scd_requirements_sync_text() RETURNS trigger AS $$
+    BEGIN
+        IF (TG_OP = 'INSERT' AND NEW.text_hash IS NOT NULL)
+           OR (TG_OP = 'UPDATE' AND OLD.text_hash IS NOT NULL AND NEW.text_hash IS DISTINCT FROM OLD.text_hash) THEN
+            SELECT {TEXT_COLUMNS}
+            INTO NEW.category, NEW.requirement, NEW.product, NEW.doc_link, NEW.tenant_link
+            FROM requirement_texts WHERE hash = NEW.text_hash;
+        ELSIF TG_OP = 'INSERT'
+              OR (NEW.category, NEW.requirement, NEW.product, NEW.doc_link, NEW.tenant_link)
+                 IS DISTINCT FROM (OLD.category, OLD.requirement, OLD.product, OLD.doc_link, OLD.tenant_link) THEN
+            NEW.text_hash := {TEXT_HASH_SQL.replace('coalesce(', 'coalesce(NEW.')};
+            INSERT INTO requirement_texts (hash, {TEXT_COLUMNS})
+            VALUES (NEW.text_hash, NEW.category, NEW.requirement, NEW.product, NEW.doc_link, NEW.tenant_link)
+            ON CONFLICT (hash) DO NOTHING;
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+SYNC_TRIGGER_SQL = f"""
+    CREATE TRIGGER scd_requirements_sync_text
+    BEFORE INSERT OR UPDATE OF text_hash, {TEXT_COLUMNS} ON scd_requirements
+    FOR EACH ROW EXECUTE FUNCTION scd_requirements_sync_text()
+"""
+
+
+def upgrade():
+    op.create_table('requirement_texts',
+        sa.Column('hash', sa.Text(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('requirement', sa.Text(), nullable=False),
+        sa.Column('product', sa.String(), nullable=True),
+        sa.Column('doc_link', sa.String(), nullable=True),
+        sa.Column('tenant_link', sa.String(), nullable=True),
+        sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR_SQL, persisted=True)),
+        sa.PrimaryKeyConstraint('hash')
+    )
+    op.add_column('scd_requirements', sa.Column('text_hash', sa.Text(), nullable=True))
+
+    # Hash the existing rows in batches while the old columns are still in use,
+    # then copy each distinct text once
+    backfill('scd_requirements', f"text_hash = {TEXT_HASH_SQL}", "text_hash IS NULL")
+    op.execute(INSERT_TEXTS_SQL)
+    create_index_concurrently('ix_scd_requirements_text_hash', 'scd_requirements', ['text_hash'])
+    create_index_concurrently('ix_requirement_texts_search_vector', 'requirement_texts', ['search_vector'], postgresql_using='gin')
+    op.execute(SYNC_FUNCTION_SQL)
+    op.execute(SYNC_TRIGGER_SQL)
+
+    # Rows written by the previous release during the backfill
+    op.execute(f"UPDATE scd_requirements SET text_hash = {TEXT_HASH_SQL} WHERE text_hash IS NULL")
+    op.execute(INSERT_TEXTS_SQL)
+    op.alter_column('scd_requirements', 'text_hash', nullable=False)
+    op.create_foreign_key(
+        'scd_requirements_text_hash_fkey', 'scd_requirements', 'requirement_texts', ['text_hash'], ['hash']
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER scd_requirements_sync_text ON scd_requirements")
+    op.execute("DROP FUNCTION scd_requirements_sync_text()")
+    op.drop_constraint('scd_requirements_text_hash_fkey', 'scd_requirements', type_='foreignkey')
+    drop_index_concurrently('ix_scd_requirements_text_hash', 'scd_requirements')
+    op.drop_column('scd_requirements', 'text_hash')
+    op.drop_table('requirement_texts')
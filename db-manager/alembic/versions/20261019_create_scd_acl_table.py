@@ -0,0 +1,37 @@
+"""create scd_acl table for sharing success criteria documents
+
+Revision ID: 20261019_create_scd_acl_table
+Revises: 20261019_create_scd_versions_table
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_create_scd_acl_table'
+down_revision = '20261019_create_scd_versions_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scd_acl',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('principal', sa.String(), nullable=False),
+        sa.Column('permission', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('created_by', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['success_criteria_documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_scd_acl_document_id_principal', 'scd_acl', ['document_id', 'principal'], unique=True)
+    op.create_index('ix_scd_acl_principal_document_id', 'scd_acl', ['principal', 'document_id'])
+
+
+def downgrade():
+    op.drop_index('ix_scd_acl_principal_document_id', table_name='scd_acl')
+    op.drop_index('ix_scd_acl_document_id_principal', table_name='scd_acl')
+    op.drop_table('scd_acl')
@@ -0,0 +1,53 @@
+"""create scd_versions table and record the current state of every scd as version 1
+
+Revision ID: 20261019_create_scd_versions_table
+Revises: 20261019_create_requirement_texts
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_create_scd_versions_table'
+down_revision = '20261019_create_requirement_texts'
+branch_labels = None
+depends_on = None
+
+# Same snapshot format as backend/versions.py
+SEED_VERSIONS_SQL = """
+    INSERT INTO scd_versions (document_id, version, created_at, checkpoint)
+    SELECT d.id, 1, d.updated_at, jsonb_build_object(
+        'name', d.name,
+        'description', d.description,
+        'requirements', COALESCE((
+            SELECT jsonb_agg(jsonb_build_array(r.id, r.text_hash, r.original_requirement_id) ORDER BY r."order", r.id)
+            FROM scd_requirements r
+            WHERE r.document_id = d.id
+        ), '[]'::jsonb)
+    )
+    FROM success_criteria_documents d
+"""
+
+
+def upgrade():
+    op.create_table('scd_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('created_by', sa.String(), nullable=True),
+        sa.Column('diff', postgresql.JSONB(), nullable=True),
+        sa.Column('checkpoint', postgresql.JSONB(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['success_criteria_documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_scd_versions_document_id_version', 'scd_versions', ['document_id', 'version'], unique=True)
+    op.execute(SEED_VERSIONS_SQL)
+
+
+def downgrade():
+    op.drop_index('ix_scd_versions_document_id_version', table_name='scd_versions')
+    op.drop_table('scd_versions')
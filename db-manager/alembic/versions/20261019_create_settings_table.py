@@ -0,0 +1,31 @@
+"""create settings table
+
+Revision ID: 20261019_create_settings_table
+Revises: 20261019_create_refresh_tokens_table
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_create_settings_table'
+down_revision = '20261019_create_refresh_tokens_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('settings',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('value', postgresql.JSONB(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_by', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('settings')
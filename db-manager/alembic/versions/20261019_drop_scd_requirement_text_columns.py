@@ -0,0 +1,96 @@
+"""drop the text columns of scd_requirements now held in requirement_texts (contract)
+
+Only apply once no backend from before 20261019_create_requirement_texts is
+running: until then the previous release still reads and writes these columns.
+Deploy the db-manager with ALEMBIC_TARGET=20261019_add_audit_log_details_json
+for that rollout and with the default (head) afterwards.
+
+Revision ID: 20261019_drop_scd_requirement_text_columns
+Revises: 20261019_add_audit_log_details_json
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from online_migrations import create_index_concurrently, drop_index_concurrently, backfill
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_drop_scd_requirement_text_columns'
+down_revision = '20261019_add_audit_log_details_json'
+branch_labels = None
+depends_on = None
+
+TEXT_COLUMNS = 'category, requirement, product, doc_link, tenant_link'
+
+TEXT_HASH_SQL = (
+    "md5(coalesce(NEW.category, chr(30)) || chr(31) || coalesce(NEW.requirement, chr(30)) || chr(31) || "
+    "coalesce(NEW.product, chr(30)) || chr(31) || coalesce(NEW.doc_link, chr(30)) || chr(31) || "
+    "coalesce(NEW.tenant_link, chr(30)))"
+)
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(requirement, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(product, '')), 'C')"
+)
+
+# Same as in 20261019_create_requirement_texts, restored on downgrade
+SYNC_FUNCTION_SQL = f"""
+    CREATE FUNCTION scd_requirements_sync_text() RETURNS trigger AS $$
+    BEGIN
+        IF (TG_OP = 'INSERT' AND NEW.text_hash IS NOT NULL)
+           OR (TG_OP = 'UPDATE' AND OLD.text_hash IS NOT NULL AND NEW.text_hash IS DISTINCT FROM OLD.text_hash) THEN
+            SELECT {TEXT_COLUMNS}
+            INTO NEW.category, NEW.requirement, NEW.product, NEW.doc_link, NEW.tenant_link
+            FROM requirement_texts WHERE hash = NEW.text_hash;
+        ELSIF TG_OP = 'INSERT'
+              OR (NEW.category, NEW.requirement, NEW.product, NEW.doc_link, NEW.tenant_link)
+                 IS DISTINCT FROM (OLD.category, OLD.requirement, OLD.product, OLD.doc_link, OLD.tenant_link) THEN
+            NEW.text_hash := {TEXT_HASH_SQL};
+            INSERT INTO requirement_texts (hash, {TEXT_COLUMNS})
+            VALUES (NEW.text_hash, NEW.category, NEW.requirement, NEW.product, NEW.doc_link, NEW.tenant_link)
+            ON CONFLICT (hash) DO NOTHING;
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+SYNC_TRIGGER_SQL = f"""
+    CREATE TRIGGER scd_requirements_sync_text
+    BEFORE INSERT OR UPDATE OF text_hash, {TEXT_COLUMNS} ON scd_requirements
+    FOR EACH ROW EXECUTE FUNCTION scd_requirements_sync_text()
+"""
+
+
+def upgrade():
+    op.execute("DROP TRIGGER scd_requirements_sync_text ON scd_requirements")
+    op.execute("DROP FUNCTION scd_requirements_sync_text()")
+    drop_index_concurrently('ix_scd_requirements_search_vector', 'scd_requirements')
+    for column in ('search_vector', 'category', 'requirement', 'product', 'doc_link', 'tenant_link'):
+        op.drop_column('scd_requirements', column)
+
+
+def downgrade():
+    op.add_column('scd_requirements', sa.Column('category', sa.String(), nullable=True))
+    op.add_column('scd_requirements', sa.Column('requirement', sa.Text(), nullable=True))
+    op.add_column('scd_requirements', sa.Column('product', sa.String(), nullable=True))
+    op.add_column('scd_requirements', sa.Column('doc_link', sa.String(), nullable=True))
+    op.add_column('scd_requirements', sa.Column('tenant_link', sa.String(), nullable=True))
+    op.execute(SYNC_FUNCTION_SQL)
+    op.execute(SYNC_TRIGGER_SQL)
+    backfill(
+        'scd_requirements',
+        f"({TEXT_COLUMNS}) = (SELECT {TEXT_COLUMNS} FROM requirement_texts x WHERE x.hash = scd_requirements.text_hash)",
+        "category IS NULL",
+    )
+    op.alter_column('scd_requirements', 'category', nullable=False)
+    op.alter_column('scd_requirements', 'requirement', nullable=False)
+    op.add_column('scd_requirements', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(SEARCH_VECTOR_SQL, persisted=True),
+    ))
+    create_index_concurrently('ix_scd_requirements_search_vector', 'scd_requirements', ['search_vector'], postgresql_using='gin')
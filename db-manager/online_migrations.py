@@ -0,0 +1,149 @@
+"""
+Helpers for running schema changes while the backend stays online.
+
+Every migration runs with lock_timeout/statement_timeout set (see env.py), so
+DDL that cannot get its lock quickly fails instead of queueing every other
+query behind it. The helpers below run outside the migration transaction:
+
+    from online_migrations import create_index_concurrently, backfill
+
+    def upgrade():
+        create_index_concurrently('ix_audit_logs_user_email', 'audit_logs', ['user_email'])
+        backfill('audit_logs', "details_json = jsonb_build_object('text', details)", "details_json IS NULL")
+"""
+import os
+import sys
+import time
+from alembic import op
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+STATEMENT_TIMEOUT = os.getenv("MIGRATION_STATEMENT_TIMEOUT", "15min")
+LOCK_RETRIES = int(os.getenv("MIGRATION_LOCK_RETRIES", "5"))
+LOCK_RETRY_DELAY = float(os.getenv("MIGRATION_LOCK_RETRY_DELAY", "2"))
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def is_lock_timeout(error):
+    return getattr(getattr(error, "orig", None), "pgcode", None) == LOCK_NOT_AVAILABLE
+
+
+def set_timeouts(connection, lock_timeout=LOCK_TIMEOUT, statement_timeout=STATEMENT_TIMEOUT):
+    connection.execute(text("SELECT set_config('lock_timeout', :value, false)"), {"value": lock_timeout})
+    connection.execute(text("SELECT set_config('statement_timeout', :value, false)"), {"value": statement_timeout})
+
+
+def with_lock_retry(fn, retries=LOCK_RETRIES, delay=LOCK_RETRY_DELAY):
+    """Call fn() again with exponential backoff whenever it hits lock_timeout.
+
+    fn must run its statements in their own transaction (or in autocommit),
+    since a failed statement aborts the surrounding transaction.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            return fn()
+        except OperationalError as e:
+            if not is_lock_timeout(e) or attempt == retries:
+                raise
+            wait = delay * 2 ** (attempt - 1)
+            print(f"Lock not available (attempt {attempt}/{retries}), retrying in {wait:.1f}s", file=sys.stderr)
+            time.sleep(wait)
+
+
+def execute_with_lock_retry(sql, retries=LOCK_RETRIES, delay=LOCK_RETRY_DELAY):
+    """Run a short DDL statement in its own transaction, retrying on lock timeouts."""
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+
+        def attempt():
+            connection.exec_driver_sql("BEGIN")
+            try:
+                connection.exec_driver_sql(sql)
+            except Exception:
+                connection.exec_driver_sql("ROLLBACK")
+                raise
+            connection.exec_driver_sql("COMMIT")
+
+        with_lock_retry(attempt, retries, delay)
+
+
+def _drop_invalid_index(connection, name):
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind
+    invalid = connection.execute(
+        text("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :name AND NOT i.indisvalid
+        """),
+        {"name": name},
+    ).scalar()
+    if invalid:
+        connection.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def create_index_concurrently(name, table, columns, unique=False, **kw):
+    """CREATE INDEX CONCURRENTLY outside the migration transaction, safe to re-run."""
+    if op.get_context().as_sql:
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True, **kw)
+        return
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        # Building the index may legitimately take longer than the statement guard
+        set_timeouts(connection, statement_timeout="0")
+
+        def attempt():
+            _drop_invalid_index(connection, name)
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True, **kw)
+
+        with_lock_retry(attempt)
+        set_timeouts(connection)
+
+
+def drop_index_concurrently(name, table):
+    with op.get_context().autocommit_block():
+        with_lock_retry(lambda: op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True))
+
+
+def backfill(table, set_sql, where_sql, batch_size=5000, sleep=0.1, key="id"):
+    """UPDATE `table` SET `set_sql` in batches of `batch_size` rows matching `where_sql`.
+
+    Walks the table in primary key order and commits after every batch, so
+    row locks are held briefly and progress survives an interrupted run
+    (`where_sql` must exclude rows that were already done). Sleeps `sleep`
+    seconds between batches to leave I/O for the live application.
+    """
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        total = connection.execute(text(f"SELECT count(*) FROM {table} WHERE {where_sql}")).scalar()
+        print(f"Backfilling {total} rows in {table}", file=sys.stderr)
+
+        done = 0
+        last_key = None
+        started = time.monotonic()
+        while True:
+            after = f"AND {key} > :last_key" if last_key is not None else ""
+            batch = text(f"""
+                UPDATE {table} SET {set_sql}
+                WHERE {key} IN (
+                    SELECT {key} FROM {table}
+                    WHERE ({where_sql}) {after}
+                    ORDER BY {key}
+                    LIMIT :batch_size
+                )
+                RETURNING {key}
+            """)
+            params = {"last_key": last_key, "batch_size": batch_size}
+            keys = with_lock_retry(lambda: connection.execute(batch, params).scalars().all())
+            if not keys:
+                break
+            done += len(keys)
+            last_key = max(keys)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            print(f"  {table}: {done}/{total} rows ({done / elapsed:.0f} rows/s)", file=sys.stderr)
+            if sleep:
+                time.sleep(sleep)
+        print(f"Backfilled {done} rows in {table}", file=sys.stderr)
+        return done
@@ -10,6 +10,8 @@ interface AuditLog {
   user_email: string;
   action: string;
   details: string;
+  // Entity, ids and changed fields; long id runs are folded into id_ranges
+  details_json?: Record<string, unknown> | null;
   ip_address: string;
   timestamp: string;
 }
@@ -148,7 +150,7 @@ const AuditLogsPage: React.FC = () => {
                   <td style={{ padding: '10px 16px', borderBottom: '1px solid var(--light-blue-02)', fontFamily: 'Inter, Arial, sans-serif', fontSize: 15, color: 'var(--deep-gray)', whiteSpace: 'nowrap' }}>{formatDate(log.timestamp)}</td>
                   <td style={{ padding: '10px 16px', borderBottom: '1px solid var(--light-blue-02)', fontFamily: 'Inter, Arial, sans-serif', fontSize: 15, color: 'var(--deep-gray)' }}>{log.user_email}</td>
                   <td style={{ padding: '10px 16px', borderBottom: '1px solid var(--light-blue-02)', color: 'var(--deep-gray)' }}>{log.action}</td>
-                  <td style={{ padding: '10px 16px', borderBottom: '1px solid var(--light-blue-02)', color: 'var(--deep-gray)', maxWidth: 320, overflow: 'hidden', textOverflow: 'ellipsis', whiteSpace: 'nowrap' }} title={log.details}>{log.details}</td>
+                  <td style={{ padding: '10px 16px', borderBottom: '1px solid var(--light-blue-02)', color: 'var(--deep-gray)', maxWidth: 320, overflow: 'hidden', textOverflow: 'ellipsis', whiteSpace: 'nowrap' }} title={log.details_json ? `${log.details}\n${JSON.stringify(log.details_json)}` : log.details}>{log.details}</td>
                   <td style={{ padding: '10px 16px', borderBottom: '1px solid var(--light-blue-02)', color: 'var(--deep-gray)' }}>{log.ip_address}</td>
                 </tr>
               ))
@@ -1,66 +1,63 @@
 import React, { useState, useEffect, useMemo } from 'react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { Link } from 'react-router-dom';
-import { apiRequest, parseProducts } from './utils/api';
+import { apiRequest } from './utils/api';
 
-interface Requirement {
+interface StatsCell {
   category: string;
-  product?: string;
+  product: string;
+  total: number;
+}
+
+interface RequirementStats {
+  total: number;
+  recent: number;
+  recent_days: number;
+  products: { product: string; total: number }[];
+  matrix: StatsCell[];
 }
 
 const Dashboard: React.FC = () => {
-  const [requirements, setRequirements] = useState<Requirement[]>([]);
+  const [stats, setStats] = useState<RequirementStats | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
-    const fetchRequirements = async () => {
+    const fetchStats = async () => {
       try {
         setLoading(true);
-        const data = await apiRequest('/api/requirements');
-        setRequirements(data);
+        const data = await apiRequest('/api/stats/requirements');
+        setStats(data);
       } catch (e: any) {
         setError(e.message || 'An error occurred');
       } finally {
         setLoading(false);
       }
     };
-    fetchRequirements();
+    fetchStats();
   }, []);
 
   const { chartData, products } = useMemo(() => {
-    if (requirements.length === 0) {
+    if (!stats || stats.matrix.length === 0) {
       return { chartData: [], products: [] };
     }
 
-    const productsSet = new Set<string>();
     const dataMap = new Map<string, any>();
 
-    requirements.forEach(req => {
-      const category = req.category || 'Uncategorized';
-      
-      const productNames = parseProducts(req.product);
-      if (productNames.length === 0) {
-        productNames.push('N/A');
-      }
-      
-      productNames.forEach(pName => productsSet.add(pName));
-
+    stats.matrix.forEach(cell => {
+      const category = cell.category || 'Uncategorized';
       if (!dataMap.has(category)) {
         dataMap.set(category, { name: category });
       }
-
       const categoryData = dataMap.get(category);
-      productNames.forEach(pName => {
-        categoryData[pName] = (categoryData[pName] || 0) + 1;
-      });
+      categoryData[cell.product] = (categoryData[cell.product] || 0) + cell.total;
     });
 
     return { 
       chartData: Array.from(dataMap.values()), 
-      products: Array.from(productsSet).sort()
+      products: stats.products.map(p => p.product).sort()
     };
-  }, [requirements]);
+  }, [stats]);
 
   const COLORS = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#AF19FF', '#FF1919'];
 
@@ -83,6 +80,11 @@ const Dashboard: React.FC = () => {
   return (
     <div style={{ padding: '24px', height: 'calc(100vh - 120px)' }}>
       <h1>Dashboard</h1>
+      {stats && (
+        <p>
+          {stats.total} requirements, {stats.recent} changed in the last {stats.recent_days} days
+        </p>
+      )}
       <ResponsiveContainer width="100%" height="90%">
         <BarChart
           layout="vertical"
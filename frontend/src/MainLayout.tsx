@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { NavLink, Link, useLocation, useNavigate } from 'react-router-dom';
 import './MainLayout.css';
+import { logout } from './utils/api';
 
 interface MainLayoutProps {
   children: React.ReactNode;
@@ -48,8 +49,8 @@ const MainLayout: React.FC<MainLayoutProps> = ({ children }) => {
     setOpenSubMenu(openSubMenu === path ? null : path);
   };
 
-  const handleLogout = () => {
-    localStorage.removeItem('user');
+  const handleLogout = async () => {
+    await logout();
     navigate('/login');
   };
 
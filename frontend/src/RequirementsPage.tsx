@@ -2,7 +2,7 @@ import React, { useState, useEffect, useMemo } from "react";
 import './Table.css';
 import Tooltip from './Tooltip';
 import Select from 'react-select';
-import { apiRequest, parseProducts } from './utils/api';
+import { apiRequest, downloadFile, parseProducts } from './utils/api';
 import { useLocation } from 'react-router-dom';
 
 // RequirementsPage.tsx
@@ -23,6 +23,9 @@ interface Requirement {
   updated_by?: string;
 }
 
+// Facets are refetched once typing or selecting pauses for this long
+const FACETS_DEBOUNCE_MS = 300;
+
 interface SortConfig {
   key: keyof Requirement | null;
   direction: 'ascending' | 'descending';
@@ -92,30 +95,38 @@ const RequirementsPage: React.FC = () => {
     }
   }, [location.state]);
 
-  // Collect all unique category values
+  // Load category and product options from the facets API; each facet is
+  // narrowed by the other active filters. Debounced, since every keystroke in
+  // the search box changes the filters and each fetch is a server-side query.
   useEffect(() => {
-    const categoriesSet = new Set<string>();
-    requirements.forEach(r => {
-      if (r.category) {
-        categoriesSet.add(r.category);
+    let cancelled = false;
+    const fetchFacets = async () => {
+      const params = new URLSearchParams();
+      filters.category.forEach(c => params.append('category', c));
+      filters.product.forEach(p => params.append('product', p));
+      if (filters.requirement) {
+        params.append('q', filters.requirement);
       }
-    });
-    setAllCategories(Array.from(categoriesSet).sort());
-  }, [requirements]);
+      try {
+        const data = await apiRequest(`/api/requirements/facets?${params.toString()}`);
+        if (cancelled) return;
+        setAllCategories(data.categories.map((f: { value: string }) => f.value));
+        setAllProducts(data.products.map((f: { value: string }) => f.value));
+      } catch (e: any) {
+        console.error('Failed to load filter options:', e);
+      }
+    };
+    const timer = setTimeout(fetchFacets, FACETS_DEBOUNCE_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [filters, requirements]);
 
   // For react-select
   const productOptions = allProducts.map(p => ({ value: p, label: p }));
   const categoryOptions = allCategories.map(c => ({ value: c, label: c }));
 
-  // Collect all unique product values
-  useEffect(() => {
-    const productsSet = new Set<string>();
-    requirements.forEach(r => {
-      parseProducts(r.product).forEach(p => productsSet.add(p));
-    });
-    setAllProducts(Array.from(productsSet).sort());
-  }, [requirements]);
-
   // Fetch requirements from API
   useEffect(() => {
     const fetchRequirements = async () => {
@@ -295,7 +306,13 @@ const RequirementsPage: React.FC = () => {
         method: 'POST',
         body: formData,
       });
-      setBulkSuccess(`Uploaded ${data.count} requirements.`);
+      // Duplicates and near-duplicates are left out in skip mode; in the other
+      // modes they are part of the inserted or updated counts
+      const matched = `${data.duplicates} duplicates, ${data.near_duplicates} near-duplicates`;
+      setBulkSuccess(
+        `Inserted ${data.count} and updated ${data.updated} requirements; ` +
+        (data.mode === 'skip' ? `skipped ${matched}.` : `found ${matched}.`)
+      );
       setBulkFile(null);
       // Refresh requirements list
       const reqData = await apiRequest('/api/requirements');
@@ -626,10 +643,21 @@ const RequirementsPage: React.FC = () => {
             <h2>Bulk Upload</h2>
             <form onSubmit={handleBulkUploadSubmit}>
               <div style={{ marginBottom: 12 }}>
-                <input type="file" accept=".csv" onChange={handleBulkFileChange} />
+                <input type="file" accept=".csv,.xlsx,.ndjson,.jsonl,.parquet,.gz" onChange={handleBulkFileChange} />
               </div>
               <div style={{ marginBottom: 12 }}>
                 <a href="/api/requirements/template" download>Download CSV Template</a>
+                {' | '}
+                <a
+                  href="/api/requirements/template/xlsx"
+                  onClick={e => {
+                    e.preventDefault();
+                    downloadFile('/api/requirements/template/xlsx', 'requirements_template.xlsx')
+                      .catch((err: any) => setBulkError(err.message || 'Failed to download template'));
+                  }}
+                >
+                  Download Excel Template
+                </a>
               </div>
               {bulkError && <div style={{ color: 'red', marginBottom: 8 }}>{bulkError}</div>}
               {bulkSuccess && <div style={{ color: 'green', marginBottom: 8 }}>{bulkSuccess}</div>}
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams } from 'react-router-dom';
-import { apiRequest, formatDate } from './utils/api';
+import { apiRequest, downloadFile, formatDate } from './utils/api';
 import './Table.css';
 import Select from 'react-select';
 
@@ -59,6 +59,7 @@ const SCDDetailPage: React.FC = () => {
   const [selectedReqs, setSelectedReqs] = useState<Set<number>>(new Set());
   const [addLoading, setAddLoading] = useState(false);
   const [addError, setAddError] = useState<string | null>(null);
+  const [exportError, setExportError] = useState<string | null>(null);
 
   // New state for modal filters
   const [modalFilters, setModalFilters] = useState({
@@ -100,15 +101,10 @@ const SCDDetailPage: React.FC = () => {
       const availableReqs = masterList.filter((r: Requirement) => !existingIds.has(r.id));
       setMasterRequirements(availableReqs);
 
-      // Pre-populate filter dropdowns
-      const categoriesSet = new Set<string>();
-      const productsSet = new Set<string>();
-      availableReqs.forEach((r: Requirement) => {
-        categoriesSet.add(r.category);
-        (r.product || '').split(/[,;]/).map(p => p.trim()).filter(Boolean).forEach(p => productsSet.add(p));
-      });
-      setAllCategories(Array.from(categoriesSet).sort());
-      setAllProducts(Array.from(productsSet).sort());
+      // Pre-populate filter dropdowns from requirements not yet in this document
+      const facets = await apiRequest(`/api/requirements/facets?exclude_scd=${id}`);
+      setAllCategories(facets.categories.map((f: { value: string }) => f.value));
+      setAllProducts(facets.products.map((f: { value: string }) => f.value));
 
     } catch (err: any) {
       setAddError(err.message || "Failed to load master requirements list.");
@@ -145,6 +141,17 @@ const SCDDetailPage: React.FC = () => {
     setSelectedReqs(newSelection);
   };
 
+  const handleExport = async (format: string) => {
+    if (!id || !scd) return;
+    setExportError(null);
+    try {
+      const name = scd.name.replace(/[^A-Za-z0-9]+/g, '-').replace(/^-+|-+$/g, '').toLowerCase() || 'document';
+      await downloadFile(`/api/scd/${id}/export?format=${format}`, `${name}.${format}`);
+    } catch (err: any) {
+      setExportError(err.message || 'Failed to export document.');
+    }
+  };
+
   const handleAddSubmit = async () => {
     if (!id || selectedReqs.size === 0) return;
     setAddLoading(true);
@@ -189,8 +196,22 @@ const SCDDetailPage: React.FC = () => {
 
       <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '20px' }}>
         <h2>Requirements in this Document</h2>
-        <button className="primary-btn" onClick={handleOpenAddModal}>Add Requirements</button>
+        <div style={{ display: 'flex', gap: '10px' }}>
+          <select
+            value=""
+            onChange={e => e.target.value && handleExport(e.target.value)}
+            disabled={scd.requirements.length === 0}
+          >
+            <option value="">Export...</option>
+            <option value="csv">CSV</option>
+            <option value="xlsx">Excel (XLSX)</option>
+            <option value="md">Markdown</option>
+            <option value="html">HTML</option>
+          </select>
+          <button className="primary-btn" onClick={handleOpenAddModal}>Add Requirements</button>
+        </div>
       </div>
+      {exportError && <div className="error-message">{exportError}</div>}
 
       {scd.requirements.length === 0 ? (
         <p>This document does not contain any requirements yet.</p>
@@ -49,8 +49,9 @@ const SuccessCriteriaPage: React.FC = () => {
     setLoading(true);
     setError(null);
     try {
-      const data = await apiRequest('/api/scd');
-      setScds(data);
+      // Documents shared with the user are listed after their own
+      const [owned, shared] = await Promise.all([apiRequest('/api/scd'), apiRequest('/api/scd/shared')]);
+      setScds([...owned, ...shared]);
     } catch (err: any) {
       setError(err.message || 'Failed to fetch Success Criteria Documents.');
     } finally {
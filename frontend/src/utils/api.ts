@@ -36,9 +36,65 @@ export const handleApiResponse = async (response: Response) => {
   return response.json();
 };
 
-export const getAuthHeaders = (): Record<string, string> => {
+const getStoredUser = (): any => {
   const user = localStorage.getItem('user');
-  const token = user ? JSON.parse(user).token : null;
+  return user ? JSON.parse(user) : null;
+};
+
+let refreshInFlight: Promise<void> | null = null;
+
+// Run fn while holding a lock shared by every tab of this origin, so only one
+// tab at a time presents a refresh token. Browsers without the Web Locks API
+// run it directly.
+const withSessionLock = async (fn: () => Promise<void>): Promise<void> => {
+  if (typeof navigator !== 'undefined' && navigator.locks) {
+    return navigator.locks.request('session-refresh', fn);
+  }
+  return fn();
+};
+
+// Exchange the refresh token for a new access token (and a rotated refresh
+// token) without going through Google sign-in again.
+const refreshSession = async (): Promise<void> => {
+  const user = getStoredUser();
+  if (!user || !user.refresh_token) {
+    localStorage.removeItem('user');
+    throw new Error('Session expired');
+  }
+  // A refresh token is only valid once, and presenting a rotated one revokes
+  // the whole login, so requests in this tab share one refresh and tabs take
+  // turns through the lock
+  if (!refreshInFlight) {
+    refreshInFlight = withSessionLock(async () => {
+      // Another tab may have rotated the token while this one waited
+      const current = getStoredUser();
+      if (!current || !current.refresh_token) {
+        throw new Error('Session expired');
+      }
+      if (current.refresh_token !== user.refresh_token && current.token && !isTokenExpired(current.token)) {
+        return;
+      }
+      const response = await fetch('/api/token/refresh', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: current.refresh_token }),
+      });
+      if (!response.ok) {
+        localStorage.removeItem('user');
+        throw new Error('Session expired');
+      }
+      const data = await response.json();
+      localStorage.setItem('user', JSON.stringify({ ...current, ...data }));
+    }).finally(() => {
+      refreshInFlight = null;
+    });
+  }
+  return refreshInFlight;
+};
+
+export const getAuthHeaders = (): Record<string, string> => {
+  const user = getStoredUser();
+  const token = user ? user.token : null;
   
   // Check if token exists and is not expired
   if (token && isTokenExpired(token)) {
@@ -49,8 +105,25 @@ export const getAuthHeaders = (): Record<string, string> => {
   return token ? { 'Authorization': `Bearer ${token}` } : {};
 };
 
+export const logout = async () => {
+  const user = getStoredUser();
+  localStorage.removeItem('user');
+  if (user && user.refresh_token) {
+    await fetch('/api/token/revoke', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token: user.refresh_token }),
+    }).catch(() => undefined);
+  }
+};
+
 export const apiRequest = async (url: string, options: RequestInit = {}) => {
   try {
+    const user = getStoredUser();
+    if (user && user.token && isTokenExpired(user.token)) {
+      await refreshSession();
+    }
+
     const headers: Record<string, string> = {
       ...getAuthHeaders(),
     };
@@ -74,6 +147,31 @@ export const apiRequest = async (url: string, options: RequestInit = {}) => {
   }
 };
 
+// Fetch a file with the session's credentials and save it in the browser
+export const downloadFile = async (url: string, filename: string) => {
+  const user = getStoredUser();
+  if (user && user.token && isTokenExpired(user.token)) {
+    await refreshSession();
+  }
+  const response = await fetch(url, { headers: getAuthHeaders() });
+  if (response.status === 401) {
+    localStorage.removeItem('user');
+    throw new Error('Session expired');
+  }
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({ detail: 'Download failed' }));
+    throw new Error(error.detail || 'Download failed');
+  }
+  const blob = await response.blob();
+  const link = document.createElement('a');
+  link.href = URL.createObjectURL(blob);
+  link.download = filename;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  URL.revokeObjectURL(link.href);
+};
+
 export const formatDate = (dateString?: string | null): string => {
   if (!dateString) {
     return 'N/A';